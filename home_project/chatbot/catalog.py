@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from collections import namedtuple
+import numpy as np
+from search_app.backends import query_terms
+from search_app.fuzzy import TrigramIndex
+from search_app.semantic import MIN_SCORE, TfidfIndex, synonyms
+from product_app.catalog import CatalogIndexRegistry
+from .nlp_utils import build_vocabulary, singular
+
+# ------------------------------
+# Columnar catalog
+# ------------------------------
+# The chatbot answers from a snapshot of the catalog held as columns: prices
+# in a float array, brand / colour / category / sub-category as integer codes
+# into sorted label lists, and a token index mapping each word to the rows it
+# appears in. Price ranges and keywords become boolean masks and score
+# vectors over those arrays, so a reply never reaches the database. The
+# snapshot is rebuilt in one pass when the catalog version changes; only
+# its TF-IDF matrix is carried over and updated for the changed products.
+CODED_COLUMNS = ("brand", "color", "category", "sub_category")
+# How much a keyword counts depending on where it is found, as in the search index
+FIELD_WEIGHTS = (("p_name", 10), ("brand", 6), ("category", 4), ("sub_category", 4), ("color", 2), ("description", 1))
+RESULT_LIMIT = 10
+
+# `related` when nothing matched a keyword and the rows are only close by TF-IDF
+Matches = namedtuple("Matches", "positions related")
+
+
+def encode(values):
+    """(codes, labels): each value's index into the sorted distinct labels, -1 for blanks."""
+    labels = sorted({value for value in values if value})
+    index = {label: code for code, label in enumerate(labels)}
+    return np.array([index.get(value, -1) for value in values], dtype=np.int32), labels
+
+
+class ColumnarCatalog:
+
+    def __init__(self):
+        self.rows = []
+        self.positions = {}
+        self.price = np.empty(0, dtype=np.float64)
+        self.codes = {}
+        self.labels = {}
+        self.label_codes = {}
+        self.vocabulary = {}
+        self.spelling = TrigramIndex()
+        self.semantic = TfidfIndex()
+        self.semantic_rows = np.empty(0, dtype=np.int64)
+        self.tokens = []
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def copy(self):
+        # Columns are rebuilt whole rather than patched, so start empty
+        catalog = ColumnarCatalog()
+        catalog.semantic = self.semantic.copy()
+        return catalog
+
+    def apply(self, rows):
+        """Build the columns from the catalog rows ({p_id: CatalogRow}), ordered by p_id."""
+        self.rows = [rows[p_id] for p_id in sorted(rows)]
+        self.positions = {row.p_id: position for position, row in enumerate(self.rows)}
+        self.price = np.array([float(row.price) for row in self.rows], dtype=np.float64)
+        for column in CODED_COLUMNS:
+            self.codes[column], self.labels[column] = encode([getattr(row, column) for row in self.rows])
+            self.label_codes[column] = {label: code for code, label in enumerate(self.labels[column])}
+        # Brands, colours and (sub-)categories the chatbot recognises in a message
+        self.vocabulary = build_vocabulary(self.labels)
+        # Spelling correction from the same rows, so a search never goes back to the database
+        self.spelling = TrigramIndex()
+        self.spelling.apply(rows)
+        # TF-IDF rows are in their own order; semantic_rows maps ours onto them
+        self.semantic.apply(rows)
+        self.semantic_rows = np.array([self.semantic.row_of[row.p_id] for row in self.rows], dtype=np.int64)
+
+        # token -> {row: best field weight}; tokens are singular, as message keywords are
+        weights = {}
+        for position, row in enumerate(self.rows):
+            for field, weight in FIELD_WEIGHTS:
+                for token in map(singular, query_terms(getattr(row, field) or "")):
+                    found = weights.setdefault(token, {})
+                    found[position] = max(found.get(position, 0), weight)
+        self.postings = {
+            token: (np.fromiter(found.keys(), dtype=np.int32, count=len(found)),
+                    np.fromiter(found.values(), dtype=np.float32, count=len(found)))
+            for token, found in weights.items()
+        }
+        self.tokens = sorted(self.postings)
+
+    def keyword_scores(self, terms):
+        """
+        A score per product: for each term, the best weight among the tokens
+        it is a prefix of (as the search index matches), summed over terms.
+        Terms are made singular like the tokens, so "accessories" and a
+        corrected "sofas" still match.
+        """
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        for term in map(singular, terms):
+            term_scores = np.zeros_like(scores)
+            i = bisect_left(self.tokens, term)
+            while i < len(self.tokens) and self.tokens[i].startswith(term):
+                positions, weights = self.postings[self.tokens[i]]
+                np.maximum.at(term_scores, positions, weights)
+                i += 1
+            scores += term_scores
+        return scores
+
+    def semantic_scores(self, terms):
+        """Each product's TF-IDF cosine similarity to the terms."""
+        if not self.rows:
+            return np.zeros(0, dtype=np.float32)
+        return self.semantic.scores(" ".join(terms))[self.semantic_rows]
+
+    def price_mask(self, min_price=None, max_price=None):
+        mask = np.ones(len(self.rows), dtype=bool)
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        return mask
+
+    def filter_mask(self, filters):
+        """Rows whose value is one of the given labels, for every {column: [label]} in filters."""
+        mask = np.ones(len(self.rows), dtype=bool)
+        for column, labels in filters.items():
+            codes = [self.label_codes[column][label] for label in labels if label in self.label_codes[column]]
+            mask &= np.isin(self.codes[column], codes)
+        return mask
+
+    def positions_of(self, p_ids):
+        """Row positions of the given products still in the catalog, order kept."""
+        return np.array([self.positions[p_id] for p_id in p_ids if p_id in self.positions], dtype=np.int64)
+
+    def search(self, min_price=None, max_price=None, keywords=(), filters=None, within=None, limit=None):
+        """
+        Matches with the row positions of the best matches, best scored
+        first: within the price range and equal to the filters. Without filters a row must
+        match a keyword, or failing any keyword match be close to the
+        keywords by TF-IDF; with filters, keywords only rank the rows.
+        `within` limits the search to those positions, whose order breaks ties.
+        """
+        mask = self.price_mask(min_price, max_price)
+        if filters:
+            mask &= self.filter_mask(filters)
+        candidates = np.arange(len(self.rows)) if within is None else within
+        candidates = candidates[mask[candidates]]
+        if not keywords:
+            return Matches(candidates[:limit], False)
+        terms = query_terms(" ".join(keywords))
+        scores = self.keyword_scores(terms)
+        if not scores.any() and not synonyms(terms):
+            # Nothing matched as typed: try the catalog's spelling of each word
+            corrected = self.spelling.correct(" ".join(terms))
+            if corrected:
+                terms = corrected.split()
+                scores = self.keyword_scores(terms)
+        similarity = self.semantic_scores(terms)
+        related = not scores.any()
+        if not related:
+            matched = scores > 0
+            # Similarity is below 1, so it only orders equal keyword scores
+            scores = scores + similarity
+        else:
+            # No word in common ("couch", "almirah"): the closest products by TF-IDF
+            matched = similarity >= MIN_SCORE
+            scores = similarity
+        if not filters:
+            candidates = candidates[matched[candidates]]
+        return Matches(candidates[np.argsort(-scores[candidates], kind="stable")][:limit], related)
+
+    def label(self, column, position):
+        code = self.codes[column][position]
+        return self.labels[column][code] if code >= 0 else None
+
+    def product(self, position):
+        row = self.rows[position]
+        return {
+            "id": row.p_id,
+            "name": row.p_name,
+            "price": row.price,
+            "brand": row.brand,
+            "category": self.label("category", position),
+            "sub_category": self.label("sub_category", position),
+            "color": row.color,
+            "url": f"/product_details/{row.p_id}/"
+        }
+
+
+columnar_catalog = CatalogIndexRegistry(ColumnarCatalog)
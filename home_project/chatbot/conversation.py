@@ -0,0 +1,63 @@
+import re
+from django.core.cache import caches
+
+# ------------------------------
+# Conversation state
+# ------------------------------
+# The ids of the last answer to a product query are remembered per session,
+# so "sofas" followed by "under 20000" narrows the first answer instead of
+# starting a new search. Only a message that names a kind of product, or
+# refines such an answer, sets this context. Entries expire with the "chatbot" cache's TIMEOUT and that
+# cache's MAX_ENTRIES bounds how many conversations are kept.
+conversation_cache = caches["chatbot"]
+# Enough to refine a broad answer; a larger result set is cut to its best matches
+MAX_REMEMBERED = 500
+# A message starting with one of these narrows the previous answer
+REFINE_WORDS = {"only", "just", "also", "but", "now", "and", "which", "those", "these", "them", "of"}
+RESET_WORDS = {"reset", "restart", "clear"}
+
+
+async def conversation_key(request):
+    if not request.session.session_key:
+        await request.session.acreate()
+    return f"chatbot:{request.session.session_key}"
+
+
+async def aprevious_results(request):
+    """The p_ids of the session's last answer, best first, or None."""
+    return await conversation_cache.aget(await conversation_key(request))
+
+
+async def aremember_results(request, p_ids):
+    """Keep an answer's p_ids, at most MAX_REMEMBERED of them, for the next message."""
+    await conversation_cache.aset(await conversation_key(request), list(p_ids))
+
+
+async def aforget_results(request):
+    await conversation_cache.adelete(await conversation_key(request))
+
+
+def message_words(message):
+    return re.findall(r"[a-z]+", message.lower())
+
+
+def wants_reset(message):
+    words = message_words(message)
+    return (bool(words) and words[0] in RESET_WORDS) or " ".join(words) in ("start over", "new search")
+
+
+def names_products(parsed):
+    """Whether a parsed message says what kind of product it is after: keywords or a (sub-)category."""
+    filters = parsed["filters"]
+    return bool(parsed["keywords"]) or "category" in filters or "sub_category" in filters
+
+
+def is_refinement(message, parsed):
+    """
+    Whether a message narrows the previous answer: it starts with a word
+    like "only", or names no kind of product (just a price, brand or colour).
+    """
+    words = message_words(message)
+    if words and words[0] in REFINE_WORDS:
+        return True
+    return not names_products(parsed)
@@ -1,37 +1,147 @@
 # nlp_utils.py
 import re
 
-def parse_user_message(message):
+# Amounts like "1,000", "10k", "1.5 lakh"
+NUMBER = re.compile(r"(\d+(?:,\d{2,3})*(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?)?\b")
+UNITS = {"k": 1000, "thousand": 1000, "lakh": 100000, "lakhs": 100000, "lac": 100000, "lacs": 100000}
+# Smaller bare numbers are sizes and counts ("3 seater", "4 door"), not prices
+MIN_BARE_PRICE = 100
+# A number after a price word or before a currency is a price, whatever its size ("under 50", "80 rs")
+PRICE_BEFORE = re.compile(r"(?:\b(?:under|below|less than|upto|up to|within|max|maximum|over|above|more than|"
+                          r"min|minimum|between|from|rs|inr)|₹)\W*$")
+RANGE_BEFORE = re.compile(r"\b(?:and|to)\W*$")
+CURRENCY_AFTER = re.compile(r"\s*(?:rs\b|rupees?\b|inr\b|/-)")
+
+MAX_WORDS = {"under", "below", "less", "upto", "within", "max", "maximum"}
+MIN_WORDS = {"over", "above", "more", "min", "minimum"}
+
+# Words that carry no product meaning once prices are read
+ignore_words = {
+    "less", "more", "than", "under", "over", "between", "and", "above", "below", "upto", "up", "to", "from",
+    "within", "max", "min", "products", "product", "price", "rs", "rupees", "rupee", "inr", "show", "me", "i", "want",
+    "need", "looking", "for", "find", "some", "any", "a", "an", "the", "in", "with", "of", "please", "get",
+    "give", "buy", "item", "items", "something", "like", "is", "are", "what", "which", "do", "you", "have",
+    "can", "all", "color", "colour", "brand", "category", "only", "by", "or", "on", "my", "cheap",
+    "just", "also", "but", "now", "those", "these", "them", "one", "ones",
+    # Small talk, answered with how to search rather than matched against products
+    "hi", "hii", "hello", "hey", "hlo", "there", "namaste", "good", "morning", "evening", "how", "thanks", "thank",
+    "bye", "goodbye", "ok", "okay", "help",
+}
+
+
+def singular(word):
+    """Crude plural stripping, applied alike to messages and vocabulary: sofas, lamps, accessories."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def phrase_tokens(text):
+    return tuple(singular(word) for word in re.findall(r"[^\W\d_]+", text.lower()))
+
+
+def build_vocabulary(labels):
+    """
+    {phrase tokens: (column, labels)} from the catalog's {column: [label]}.
+    A phrase found in several columns belongs to the first of them, so
+    "decor" is the category rather than the sub-category of the same name.
+    """
+    vocabulary = {}
+    for column in ("category", "sub_category", "brand", "color"):
+        for label in labels.get(column, ()):
+            phrase = phrase_tokens(label)
+            if not phrase:
+                continue
+            owner, found = vocabulary.get(phrase, (column, ()))
+            if owner == column:
+                # Labels that differ only in case ("Blue", "blue") share a phrase
+                vocabulary[phrase] = (column, found + (label,))
+    return vocabulary
+
+
+def filter_words(filters):
+    """The words of the recognised values, for searching them as plain keywords instead."""
+    words = []
+    for labels in filters.values():
+        for word in re.findall(r"[^\W\d_]+", " ".join(labels).lower()):
+            if word not in words and word not in ignore_words:
+                words.append(word)
+    return words
+
+
+def amount(number, unit):
+    return int(float(number.replace(",", "")) * UNITS.get(unit or "", 1))
+
+
+def parse_user_message(message, vocabulary=None):
+    """
+    Split a chat message into a price range, exact catalog values (brands,
+    colours, categories, sub-categories found in `vocabulary`) and the free
+    text left over as keywords.
+    """
     message = message.lower()
+    vocabulary = vocabulary or {}
     min_price = None
     max_price = None
     keywords = []
+    filters = {}
+
+    words = set(re.findall(r"[a-z]+", message.replace("up to", "upto")))
+    is_range = {"between", "and"} <= words or {"from", "to"} <= words
 
     # Extract numbers
-    numbers = [int(n) for n in re.findall(r'\d+', message)]
+    numbers = []
+    for match in NUMBER.finditer(message):
+        number, unit = match.groups()
+        before = message[:match.start()]
+        priced = (unit or PRICE_BEFORE.search(before) or CURRENCY_AFTER.match(message, match.end())
+                  or (is_range and RANGE_BEFORE.search(before)))
+        value = amount(number, unit)
+        if priced or value >= MIN_BARE_PRICE:
+            numbers.append(value)
+    text = NUMBER.sub(" ", message)
 
-    if "less than" in message or "under" in message or "below" in message:
+    if words & MAX_WORDS:
         if numbers:
             max_price = numbers[0]
 
-    elif "more than" in message or "above" in message or "over" in message:
+    elif words & MIN_WORDS:
         if numbers:
             min_price = numbers[0]
 
-    elif "between" in message and "and" in message:
+    elif is_range:
         if len(numbers) >= 2:
-            min_price, max_price = numbers[0], numbers[1]
+            min_price, max_price = min(numbers[:2]), max(numbers[:2])
 
     elif numbers:
         # If just "products under 1000" or "1000 rupees"
         max_price = numbers[0]
 
-    # Extract keywords (basic approach: remove numbers and price words)
-    ignore_words = {"less", "more", "than", "under", "over", "between", "and", "above", "below", "products", "product", "price", "rs", "rupees"}
-    keywords = [w for w in re.findall(r'\w+', message) if not w.isdigit() and w not in ignore_words]
+    # Longest catalog phrase first, so "coffee tables" beats a lone "tables"
+    tokens = phrase_tokens(text)
+    longest = max((len(phrase) for phrase in vocabulary), default=1)
+    i = 0
+    while i < len(tokens):
+        for n in range(min(longest, len(tokens) - i), 0, -1):
+            entity = vocabulary.get(tokens[i:i + n])
+            if entity:
+                column, labels = entity
+                values = filters.setdefault(column, [])
+                values.extend(label for label in labels if label not in values)
+                i += n
+                break
+        else:
+            if tokens[i] not in ignore_words:
+                keywords.append(tokens[i])
+            i += 1
 
     return {
         "min_price": min_price,
         "max_price": max_price,
+        "filters": filters,
         "keywords": keywords
     }
@@ -1,3 +1,55 @@
-from django.test import TestCase
+import json
+from django.test import SimpleTestCase, TestCase
+from category_app.models import Category
+from product_app.models import Products
+from sub_category_app.models import Sub_category
+from .catalog import columnar_catalog
+from .nlp_utils import parse_user_message
 
-# Create your tests here.
+
+class ParsePriceTests(SimpleTestCase):
+
+    def test_small_number_after_a_price_word_is_a_price(self):
+        self.assertEqual(parse_user_message("lamps under 50")["max_price"], 50)
+        self.assertEqual(parse_user_message("lamps below 99")["max_price"], 99)
+
+    def test_small_number_with_a_currency_is_a_price(self):
+        self.assertEqual(parse_user_message("lamps for 80 rs")["max_price"], 80)
+
+    def test_bare_small_number_is_not_a_price(self):
+        parsed = parse_user_message("3 seater sofa")
+        self.assertIsNone(parsed["min_price"])
+        self.assertIsNone(parsed["max_price"])
+        self.assertEqual(parsed["keywords"], ["seater", "sofa"])
+
+    def test_bare_small_number_next_to_a_price(self):
+        parsed = parse_user_message("3 seater sofa under 40000")
+        self.assertEqual((parsed["min_price"], parsed["max_price"]), (None, 40000))
+
+
+class ConversationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(category_id="HOM", category_name="Home")
+        beds = Sub_category.objects.create(sub_cat_id="BED", sub_cat_name="Beds", category=category)
+        sofas = Sub_category.objects.create(sub_cat_id="SOF", sub_cat_name="Sofas", category=category)
+        for p_id, sub_category, brand, price in (("B1", beds, "Helios", 30000), ("B2", beds, "Melody", 25000),
+                                                 ("S1", sofas, "Helios", 45000)):
+            Products.objects.create(p_id=p_id, p_name=f"{brand} {sub_category.sub_cat_name}", brand=brand,
+                                    category=category, sub_category=sub_category, stock=5, price=price)
+
+    def setUp(self):
+        columnar_catalog.reset()
+
+    def ask(self, message):
+        response = self.client.post("/api/chatbot/", json.dumps({"message": message}),
+                                    content_type="application/json")
+        return response.json()
+
+    def test_query_without_matches_ends_the_context(self):
+        self.assertEqual({product["id"] for product in self.ask("beds")["products"]}, {"B1", "B2"})
+        self.assertEqual(self.ask("sofas under 20000")["type"], "text")
+        # Not the Helios beds narrowed from the answer before the failed query
+        answer = self.ask("only Helios")
+        self.assertEqual({product["id"] for product in answer["products"]}, {"B1", "S1"})
@@ -1,68 +1,84 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from product_app.models import Products
 import json
-from .nlp_utils import parse_user_message
-from django.db.models import Q
+from .nlp_utils import filter_words, parse_user_message
+from .catalog import RESULT_LIMIT, columnar_catalog
+from .conversation import (MAX_REMEMBERED, aforget_results, aprevious_results, aremember_results, is_refinement,
+                           names_products, wants_reset)
 
+SEARCH_HINT = ("Tell me what you are looking for: a category, brand, colour or price range, "
+               "like \"sofas under 40000\" or \"blue Helios beds\".")
+
+
+def find_products(catalog, parsed, within=None):
+    """
+    Matches answering a parsed message. Answered from the in-memory
+    catalog: price and catalog values are array masks, leftover keywords
+    ranked by where they match.
+    """
+    min_price, max_price, filters, keywords = (parsed["min_price"], parsed["max_price"],
+                                               parsed["filters"], parsed["keywords"])
+    matches = catalog.search(min_price, max_price, keywords, filters, within)
+    if not len(matches.positions) and filters:
+        # Together the values match nothing ("table lamps" in "kids"): match any of their words instead
+        matches = catalog.search(min_price, max_price, keywords + filter_words(filters), within=within)
+    return matches
+
+
+# Async: the widget is on every page, and its requests are answered from
+# memory, so they should not each hold a worker thread under ASGI
 @csrf_exempt
-def chatbot_response(request):
+async def chatbot_response(request):
     if request.method == "POST":
         data = json.loads(request.body)
         user_message = data.get("message", "")
 
-        parsed = parse_user_message(user_message)
+        if wants_reset(user_message):
+            await aforget_results(request)
+            return JsonResponse({"type": "text", "response": "Okay, let's start a new search."})
+
+        # Brands, colours and categories are recognised against the catalog's own values
+        catalog = await columnar_catalog.aget()
+        parsed = parse_user_message(user_message, catalog.vocabulary)
         min_price = parsed["min_price"]
         max_price = parsed["max_price"]
+        filters = parsed["filters"]
         keywords = parsed["keywords"]
 
-        # If no filters provided, return a text response
-        if not min_price and not max_price and not keywords:
-            return JsonResponse({
-                "type": "text",
-                "response": "Please enter some search values like price range, category, or brand to find products."
-            })
-
-        products = Products.objects.all()
-        query = Q()
-
-        # Apply price filters
-        if min_price is not None:
-            query &= Q(price__gte=min_price)
-        if max_price is not None:
-            query &= Q(price__lte=max_price)
+        # Nothing to search for (a greeting, "thanks"): say how to search instead
+        if not min_price and not max_price and not filters and not keywords:
+            return JsonResponse({"type": "text", "response": f"Hi! {SEARCH_HINT}"})
 
-        # Apply keyword filters dynamically
-        if keywords:
-            q_kw = Q()
-            for kw in keywords:
-                q_kw |= (
-                    Q(p_name__icontains=kw) |
-                    Q(description__icontains=kw) |
-                    Q(category__category_name__icontains=kw) |
-                    Q(sub_category__sub_cat_name__icontains=kw) |
-                    Q(brand__icontains=kw) |
-                    Q(color__icontains=kw)
-                )
-            query &= q_kw
+        # A follow-up like "only Helios" narrows the previous answer
+        within = None
+        previous = await aprevious_results(request)
+        refining = bool(previous) and is_refinement(user_message, parsed)
+        if refining:
+            within = catalog.positions_of(previous)
 
-        products = products.filter(query).distinct()
+        matches = find_products(catalog, parsed, within)
+        if not len(matches.positions) and within is not None:
+            # Nothing in the previous answer fits: look in the whole catalog instead
+            within = None
+            matches = find_products(catalog, parsed)
 
-        if products.exists():
-            product_list = [
-                {
-                    "id": p.p_id,
-                    "name": p.p_name,
-                    "price": p.price,
-                    "brand": p.brand,
-                    "category": p.category.category_name if p.category else None,
-                    "sub_category": p.sub_category.sub_cat_name if p.sub_category else None,
-                    "color": p.color,
-                    "url": f"/product_details/{p.p_id}/"
-                }
-                for p in products[:10]  # return max 10
-            ]
+        positions = matches.positions
+        if len(positions):
+            # Only answers to a product query, or refinements of one, are followed up on;
+            # products that are merely related are too loose a context to narrow down
+            if not matches.related and (within is not None or names_products(parsed)):
+                await aremember_results(request, [catalog.rows[position].p_id for position in positions[:MAX_REMEMBERED]])
+            else:
+                await aforget_results(request)
+            product_list = [catalog.product(position) for position in positions[:RESULT_LIMIT]]
 
+            if matches.related:
+                return JsonResponse({"type": "products", "products": product_list,
+                                     "response": "I couldn’t find an exact match. These look related:"})
             return JsonResponse({"type": "products", "products": product_list})
 
-        return JsonResponse({"type": "text", "response": "I couldn’t find matching products."})
+        # A new query that finds nothing ends the conversation's context, so a follow-up
+        # is not taken as narrowing the answer before it
+        if not refining:
+            await aforget_results(request)
+        return JsonResponse({"type": "text", "response": f"I couldn’t find matching products. {SEARCH_HINT}"})
@@ -50,14 +50,16 @@ INSTALLED_APPS = [
     'cart_app',
     'order_app',
     'newsletter_app',
-    'chatbot'
+    'chatbot',
+    'search_app',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
 
-    # 👇 Add Whitenoise right after SecurityMiddleware
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # 👇 Add Whitenoise right after SecurityMiddleware (async-capable
+    # subclass, so async views stay off threads under ASGI)
+    'home_project.middleware.AsyncWhiteNoiseMiddleware',
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,6 +101,64 @@ DATABASES = {
 
 
 
+# Caches
+# "default" is per process. "shared" and "user_signals" are on local disk,
+# so every gunicorn worker on the host sees them; they hold version tokens.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-user top-k recommendations; LocMemCache evicts least recently used
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Only the catalog version; MAX_ENTRIES is far above that so culling,
+    # which deletes entries at random, never reaches it
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # One recommendation signals version per user, on disk like "shared";
+    # a culled version is re-seeded with a fresh token
+    'user_signals': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'user_signals',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
+    # Text search facet counts and results, keyed by normalised query and
+    # catalog version
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'search',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    # Query-image embeddings and top-k results, shared by web workers and
+    # the image search service; a third of the entries is culled past MAX_ENTRIES
+    'image_search': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'image_search',
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Chatbot conversation state (the last result set per session), on disk
+    # so a follow-up message can land on any worker
+    'chatbot': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'chatbot',
+        'TIMEOUT': 30 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -31,6 +31,7 @@ urlpatterns = [
     path('staff_dashboard/', include('staff_dashboard.urls')),
     path('newsletter/', include('newsletter_app.urls')),
     path("api/", include("chatbot.urls")),
+    path("search/", include("search_app.urls")),
 
 ]+static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
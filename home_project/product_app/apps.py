@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,32 @@
+from collections import namedtuple
+from django.db.models import OuterRef, Subquery
+from .models import Discount, Product_image, Products
+
+# ------------------------------
+# Product cards
+# ------------------------------
+# What a listing shows for a product: name, price, first image and
+# discount. The image and discount are correlated subqueries of the product
+# query, so a page of cards costs one query however many products it
+# holds, instead of two more per product.
+ProductCard = namedtuple("ProductCard", "p_id p_name price brand image_url discounted_price disc_percent")
+
+
+def product_cards(p_ids):
+    """A ProductCard for each of the given products that exists, in the order given."""
+    p_ids = list(p_ids)
+    # The first image and discount by id, as `.first()` picked them
+    images = (Product_image.objects.filter(p_id=OuterRef("pk"), image__isnull=False).exclude(image="")
+              .order_by("id"))
+    discounts = Discount.objects.filter(product=OuterRef("pk")).order_by("id")
+    rows = (Products.objects.filter(p_id__in=p_ids)
+            .annotate(image_name=Subquery(images.values("image")[:1]),
+                      discounted_price=Subquery(discounts.values("discounted_price")[:1]),
+                      disc_percent=Subquery(discounts.values("disc_percent")[:1]))
+            .values_list("p_id", "p_name", "price", "brand", "image_name", "discounted_price", "disc_percent"))
+    storage = Product_image._meta.get_field("image").storage
+    found = {}
+    for p_id, p_name, price, brand, image_name, discounted_price, disc_percent in rows:
+        image_url = storage.url(image_name) if image_name else None
+        found[p_id] = ProductCard(p_id, p_name, price, brand, image_url, discounted_price, disc_percent)
+    return [found[p_id] for p_id in p_ids if p_id in found]
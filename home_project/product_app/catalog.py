@@ -0,0 +1,113 @@
+import threading
+import uuid
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from .models import Products
+
+# ------------------------------
+# Catalog version
+# ------------------------------
+# Anything built from the product catalog (recommender snapshot, search
+# indexes, cached results) is tagged with this version and rebuilt when it
+# changes. It lives in the "shared" cache so every gunicorn worker on the
+# host sees the same value.
+CATALOG_VERSION_KEY = "catalog_version"
+
+
+def get_catalog_version():
+    """Return the current catalog version token."""
+    cache = caches["shared"]
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    """get_catalog_version() for async views."""
+    cache = caches["shared"]
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Mark the catalog as changed.
+
+    A fresh random token is used rather than an incremented counter, so two
+    workers bumping at the same moment can never end up on an old value.
+    """
+    version = uuid.uuid4().hex
+    caches["shared"].set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+# ------------------------------
+# Catalog indexes
+# ------------------------------
+# Per-process structures built from the catalog (autocomplete, spelling,
+# TF-IDF, the chatbot's columns, the recommender) are held by a registry
+# that brings them up to date on first use after the version changes.
+CatalogRow = namedtuple(
+    "CatalogRow", "p_id p_name brand category_id category sub_category_id sub_category price color description")
+
+
+def catalog_rows():
+    return {
+        row[0]: CatalogRow(*row)
+        for row in Products.objects.values_list(
+            'p_id', 'p_name', 'brand', 'category_id', 'category__category_name',
+            'sub_category_id', 'sub_category__sub_cat_name', 'price', 'color', 'description')
+    }
+
+
+class CatalogIndexRegistry:
+    """
+    One index per process, built on first use and replaced when the catalog
+    version changes. Readers always get a complete index; rebuilding
+    happens under a lock so only one thread does it.
+
+    By default `index_class` provides copy() and apply(rows), and the new
+    index is the previous one's copy brought up to date with catalog_rows().
+    Subclasses can override build() instead.
+    """
+
+    def __init__(self, index_class=None):
+        self._index_class = index_class
+        self._lock = threading.Lock()
+        self._snapshot = None  # (catalog version, index)
+
+    def build(self, previous):
+        """The index for the current catalog, given the one it replaces (None at first)."""
+        index = previous.copy() if previous is not None else self._index_class()
+        index.apply(catalog_rows())
+        return index
+
+    def get(self):
+        version = get_catalog_version()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    # Readers keep the old index until the new one is swapped in
+                    snapshot = (version, self.build(snapshot[1] if snapshot else None))
+                    self._snapshot = snapshot
+        return snapshot[1]
+
+    async def aget(self):
+        """get() for async views: only a rebuild, which reads the catalog from the database, leaves the loop."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == await aget_catalog_version():
+            return snapshot[1]
+        return await sync_to_async(self.get)()
+
+    def reset(self):
+        """Drop the current index; the next get() builds it from scratch."""
+        with self._lock:
+            self._snapshot = None
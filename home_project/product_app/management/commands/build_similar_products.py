@@ -0,0 +1,80 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from product_app.models import Products, Similar_product
+from user_app.utils import load_embedding_store
+
+BLOCK_ROWS = 1024
+
+
+class Command(BaseCommand):
+    help = ("Precompute the most similar products of every product from the image embeddings "
+            "and category data, and store them in the Similar_product table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=8, help="Neighbours stored per product.")
+        parser.add_argument("--w-image", type=float, default=0.6, help="Weight of image similarity.")
+        parser.add_argument("--w-sub-category", type=float, default=0.25,
+                            help="Bonus for sharing the sub-category.")
+        parser.add_argument("--w-category", type=float, default=0.1, help="Bonus for sharing the category.")
+        parser.add_argument("--w-brand", type=float, default=0.05, help="Bonus for sharing the brand.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = list(Products.objects.values_list('p_id', 'sub_category_id', 'category_id', 'brand'))
+        if len(rows) < 2:
+            self.stdout.write("Not enough products to compare.")
+            return
+        p_ids = [r[0] for r in rows]
+        codes = [encode([r[i] for r in rows]) for i in (1, 2, 3)]
+        vectors = catalog_vectors(p_ids)
+
+        top = min(options["top"], len(p_ids) - 1)
+        entries = []
+        for start in range(0, len(p_ids), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            scores = options["w_image"] * (vectors[block] @ vectors.T)
+            for weight, code in zip((options["w_sub_category"], options["w_category"], options["w_brand"]), codes):
+                scores += weight * (code[block, None] == code[None, :])
+            # A product is never its own neighbour
+            block_rows = np.arange(start, start + len(scores))
+            scores[np.arange(len(scores)), block_rows] = -np.inf
+
+            nearest = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            for i, candidates in enumerate(nearest):
+                ordered = candidates[np.argsort(-scores[i, candidates], kind="stable")]
+                product_id = p_ids[start + i]
+                entries.extend(
+                    Similar_product(product_id=product_id, similar_id=p_ids[j], rank=rank,
+                                    score=float(scores[i, j]))
+                    for rank, j in enumerate(ordered)
+                )
+
+        with transaction.atomic():
+            Similar_product.objects.all().delete()
+            Similar_product.objects.bulk_create(entries, batch_size=2000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {top} similar products for each of {len(p_ids)} products "
+            f"in {time.perf_counter() - started:.1f}s"))
+
+
+def encode(values):
+    """Integer codes for a list of values; equal values get equal codes."""
+    index = {}
+    return np.array([index.setdefault(v, len(index)) for v in values], dtype=np.int32)
+
+
+def catalog_vectors(p_ids):
+    """Unit embeddings row-aligned with p_ids; zero rows for products without one."""
+    store = load_embedding_store()
+    if store is None or not len(store):
+        return np.zeros((len(p_ids), 1), dtype=np.float32)
+    store_index = {pid: i for i, pid in enumerate(store.ids)}
+    vectors = np.zeros((len(p_ids), store.dim), dtype=np.float32)
+    found = [(i, store_index[pid]) for i, pid in enumerate(p_ids) if pid in store_index]
+    if found:
+        targets, sources = map(list, zip(*found))
+        vectors[targets] = store.rows(sources)
+    return vectors
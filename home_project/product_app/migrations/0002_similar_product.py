@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Similar_product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='product_app.products')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product_app.products')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'unique_together': {('product', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category_app', '0001_initial'),
+        ('product_app', '0002_similar_product'),
+        ('sub_category_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['date', 'p_id'], name='product_app_date_e98933_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['price', 'p_id'], name='product_app_price_a2b1ab_idx'),
+        ),
+    ]
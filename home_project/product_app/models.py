@@ -18,6 +18,13 @@ class Products(models.Model):
     price = models.DecimalField(decimal_places=2,max_digits=10)
     warranty = models.CharField(max_length=20,blank=True)
 
+    class Meta:
+        # Keyset pagination seeks along these (product_app.pagination)
+        indexes = [
+            models.Index(fields=['date', 'p_id']),
+            models.Index(fields=['price', 'p_id']),
+        ]
+
     def __str__(self):
         return self.p_name
     
@@ -31,4 +38,14 @@ class Discount(models.Model):
     disc_price = models.DecimalField(max_digits=20,decimal_places=2, default=0)
     discounted_price = models.DecimalField(max_digits=20,decimal_places=2,default=0)
 
-    
\ No newline at end of file
+    
+class Similar_product(models.Model):
+    """Precomputed neighbours of a product, written by `manage.py build_similar_products`."""
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='similar_entries')
+    similar = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['rank']
+        unique_together = ('product', 'rank')
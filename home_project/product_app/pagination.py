@@ -0,0 +1,114 @@
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.core import signing
+from django.db.models import FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Discount
+
+# ------------------------------
+# Keyset pagination
+# ------------------------------
+# Pages are fetched by seeking past the last row shown ("price > 4999 or
+# price = 4999 and p_id > 'LIV_013'") rather than by OFFSET, so page 50 costs
+# what page 1 does. Every sort ends in p_id, which makes the order total:
+# rows never repeat or go missing between pages. The cursor is the last
+# row's sort values, signed so it cannot be edited into arbitrary filters.
+PAGE_SIZE = getattr(settings, "PRODUCT_PAGE_SIZE", 24)
+CURSOR_SALT = "product_app.pagination"
+
+# order parameter -> ((field, descending), ...)
+SORTS = {
+    "": (("p_id", False),),
+    "asc": (("date", False), ("p_id", False)),
+    "desc": (("date", True), ("p_id", True)),
+    "lowest": (("price", False), ("p_id", False)),
+    "highest": (("price", True), ("p_id", True)),
+    # Undiscounted products (-1) come last
+    "high_disc": (("top_discount", True), ("p_id", False)),
+}
+RELEVANCE = "relevance"
+
+Page = namedtuple("Page", "items next_cursor")
+
+
+def top_discount():
+    """A product's highest disc_percent, or -1 without a discount."""
+    best = Discount.objects.filter(product=OuterRef("pk")).order_by("-disc_percent").values("disc_percent")[:1]
+    return Coalesce(Subquery(best), Value(-1.0), output_field=FloatField())
+
+
+def encode_cursor(order, values):
+    values = [str(v) if isinstance(v, (Decimal, datetime.date)) else v for v in values]
+    return signing.dumps({"o": order, "k": values}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(order, cursor):
+    """The sort values in `cursor`, or None if it is missing, tampered with or for another order."""
+    if not cursor:
+        return None
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get("o") != order:
+        return None
+    return data.get("k")
+
+
+def seek(keys, values):
+    """Q for the rows after `values` in the order given by `keys`."""
+    condition = Q()
+    for i, (field, descending) in enumerate(keys):
+        step = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[i]})
+        for (earlier, _), value in zip(keys[:i], values):
+            step &= Q(**{earlier: value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, order, cursor=None, size=PAGE_SIZE):
+    """One page of `queryset` sorted by SORTS[order], starting after `cursor`."""
+    keys = SORTS.get(order, SORTS[""])
+    order = order if order in SORTS else ""
+    if any(field == "top_discount" for field, _ in keys):
+        queryset = queryset.annotate(top_discount=top_discount())
+    queryset = queryset.order_by(*(f"-{field}" if descending else field for field, descending in keys))
+    values = decode_cursor(order, cursor)
+    if values is not None and len(values) == len(keys):
+        queryset = queryset.filter(seek(keys, values))
+    items = list(queryset[:size + 1])
+    if len(items) <= size:
+        return Page(items, None)
+    items = items[:size]
+    last = items[-1]
+    return Page(items, encode_cursor(order, [getattr(last, field) for field, _ in keys]))
+
+
+def ranked_page(ids, cursor=None, size=PAGE_SIZE, keep=None):
+    """
+    One page of an already ranked id list (search relevance). `keep(chunk)`
+    returns the ids of a chunk that pass the page's filters; it is only
+    asked about the stretch of the list this page walks over.
+    """
+    start = 0
+    values = decode_cursor(RELEVANCE, cursor)
+    if values is not None and len(values) == 2:
+        position, p_id = values
+        if not (0 <= position < len(ids) and ids[position] == p_id):
+            # The ranking changed under the cursor; resume after the product if it is still there
+            position = ids.index(p_id) if p_id in ids else min(position, len(ids) - 1)
+        start = position + 1
+
+    found = []
+    i = start
+    while i < len(ids) and len(found) <= size:
+        chunk = ids[i:i + size * 2]
+        kept = set(keep(chunk) if keep else chunk)
+        found.extend((i + offset, pid) for offset, pid in enumerate(chunk) if pid in kept)
+        i += len(chunk)
+    if len(found) <= size:
+        return Page([pid for _, pid in found], None)
+    found = found[:size]
+    return Page([pid for _, pid in found], encode_cursor(RELEVANCE, list(found[-1])))
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from category_app.models import Category
+from sub_category_app.models import Sub_category
+from .models import Products, Product_image, Discount
+from .catalog import bump_catalog_version
+
+# Models whose changes affect what is shown or searched in the catalog
+CATALOG_MODELS = (Products, Product_image, Discount, Category, Sub_category)
+
+
+def catalog_changed(sender, **kwargs):
+    """Bump the catalog version whenever a product or its listing data changes."""
+    bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f"catalog_save_{model.__name__}")
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f"catalog_delete_{model.__name__}")
@@ -1,3 +1,50 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from category_app.models import Category
+from sub_category_app.models import Sub_category
+from .cards import product_cards
+from .models import Discount, Product_image, Products
 
-# Create your tests here.
+
+class ProductCardsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(category_id="LIV", category_name="Living")
+        sub_category = Sub_category.objects.create(sub_cat_id="SOF", sub_cat_name="Sofas", category=category)
+        # 2 Melody products, 30 Helios; even ones have images and a discount
+        for n in range(32):
+            product = Products.objects.create(
+                p_id=f"P{n:03}", p_name=f"Sofa {n}", brand="Melody" if n < 2 else "Helios",
+                category=category, sub_category=sub_category, stock=5, price=1000 + n)
+            if n % 2 == 0:
+                Product_image.objects.create(p_id=product, image=f"product_image/p{n}_a.jpg")
+                Product_image.objects.create(p_id=product, image=f"product_image/p{n}_b.jpg")
+                Discount.objects.create(product=product, disc_percent=20, discounted_price=800 + n)
+
+    def test_cards_cost_one_query_however_many(self):
+        for count in (1, 32):
+            with self.assertNumQueries(1):
+                cards = product_cards(f"P{n:03}" for n in range(count))
+            self.assertEqual(len(cards), count)
+
+    def test_cards_follow_given_order_with_first_image_and_discount(self):
+        cards = product_cards(["P003", "P002", "missing"])
+        self.assertEqual([card.p_id for card in cards], ["P003", "P002"])
+        self.assertIsNone(cards[0].image_url)
+        self.assertIsNone(cards[0].discounted_price)
+        self.assertTrue(cards[1].image_url.endswith("product_image/p2_a.jpg"))
+        self.assertEqual(cards[1].discounted_price, 802)
+        self.assertEqual(cards[1].disc_percent, 20)
+
+    def test_product_page_queries_do_not_grow_with_the_page(self):
+        counts = []
+        for brand in ("Melody", "Helios"):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("product_page"), {"brand": brand})
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(response.context["product_images"]), 24)
+        self.assertEqual(counts[0], counts[1])
@@ -1,11 +1,12 @@
 from django.shortcuts import render,redirect
 from category_app.models import Category
 from sub_category_app.models import Sub_category
-from .models import Products, Product_image, Discount
+from .models import Products, Product_image, Discount, Similar_product
 from django.contrib import messages
 from cart_app.models import Wishlist
 from user_app.models import RecentlyViewed
 from django.utils import timezone
+from .cards import product_cards
 
 # Create your views here.
 def add_product(request):
@@ -191,17 +192,15 @@ def product_details(request, id):
         wishlist_ids = []  # empty if not logged in
 
     discount = Discount.objects.filter(product=product).first()
-    product_images = []
-    all_products = Products.objects.filter(sub_category=product.sub_category).exclude(p_id=product.p_id)[:4]
-    
-    for p in all_products:
-        image = Product_image.objects.filter(p_id=p).first()
-        disc = Discount.objects.filter(product=p).first()
-        product_images.append({
-            'product_id': p,
-            'image': image,
-            'discount': disc
-        })
+
+    # Related products come from the precomputed Similar_product table
+    # (manage.py build_similar_products); until it has been built, or for
+    # products added since, fall back to the same sub-category.
+    related_ids = list(Similar_product.objects.filter(product=product).values_list('similar_id', flat=True)[:4])
+    if not related_ids:
+        related_ids = list(Products.objects.filter(sub_category=product.sub_category)
+                           .exclude(p_id=product.p_id).values_list('p_id', flat=True)[:4])
+    product_images = product_cards(related_ids)
 
     # ✅ Recently viewed only for logged-in users
     if request.user.is_authenticated:
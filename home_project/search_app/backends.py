@@ -0,0 +1,245 @@
+import logging
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Product search backends
+# ------------------------------
+# A backend ranks product ids for a free-text query and keeps its own index
+# in step with the catalog (see search_app.signals). The index is built from
+# each product's name, brand, category, sub-category, colour and description.
+# SEARCH_BACKEND may name a backend class; otherwise it follows the database.
+SEARCH_BACKEND = getattr(settings, "SEARCH_BACKEND", None)
+DOCUMENT_FIELDS = ('p_id', 'p_name', 'brand', 'category__category_name',
+                   'sub_category__sub_cat_name', 'color', 'description')
+INDEX_BATCH = 500
+
+
+def query_terms(query):
+    """Lower-cased word tokens of a query; anything else (quotes, operators) is dropped."""
+    return re.findall(r"\w+", (query or "").lower())
+
+
+def product_documents(products):
+    """(p_id, name, brand, category, sub-category, colour, description) rows for a Products queryset."""
+    for row in products.values_list(*DOCUMENT_FIELDS).iterator():
+        yield tuple(value or "" for value in row)
+
+
+class SearchBackend:
+    """
+    Base class. `search` returns product ids, best match first. Every term
+    must match (as a word prefix) unless `match_any` is set.
+    """
+
+    def search(self, query, limit=None, match_any=False):
+        raise NotImplementedError
+
+    def index_products(self, products):
+        """(Re)index the products in a queryset."""
+
+    def remove_products(self, p_ids):
+        """Drop products from the index."""
+
+    def rebuild(self, products):
+        """Replace the whole index with the given queryset."""
+
+    @classmethod
+    def is_ready(cls, connection):
+        return True
+
+
+class IcontainsSearchBackend(SearchBackend):
+    """Substring match on the database, unranked. Used where no text index is available."""
+
+    def search(self, query, limit=None, match_any=False):
+        from product_app.models import Products
+        terms = query_terms(query)
+        if not terms:
+            return []
+        clauses = [
+            Q(p_name__icontains=term) | Q(description__icontains=term) | Q(brand__icontains=term) |
+            Q(category__category_name__icontains=term) | Q(sub_category__sub_cat_name__icontains=term) |
+            Q(color__icontains=term)
+            for term in terms
+        ]
+        condition = clauses[0]
+        for clause in clauses[1:]:
+            condition = condition | clause if match_any else condition & clause
+        ids = Products.objects.filter(condition).order_by('p_id').values_list('p_id', flat=True)
+        return list(ids[:limit] if limit else ids)
+
+
+class SqliteSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 table with the porter stemmer and 2/3-character prefix
+    indexes, ranked by bm25 with the product name weighted highest.
+    """
+    table = "search_product_fts"
+    # bm25 weight per column, in table order (p_id is not indexed)
+    weights = (0, 10.0, 6.0, 4.0, 4.0, 2.0, 1.0)
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "p_id UNINDEXED, p_name, brand, category, sub_category, color, description, "
+            "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    @classmethod
+    def is_ready(cls, connection):
+        return cls.table in connection.introspection.table_names()
+
+    def search(self, query, limit=None, match_any=False):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = (" OR " if match_any else " ").join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(w) for w in self.weights)
+        sql = (f"SELECT p_id FROM {self.table} WHERE {self.table} MATCH %s "
+               f"ORDER BY bm25({self.table}, {weights}), p_id")
+        params = [match]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, products):
+        rows = list(product_documents(products))
+        with connection.cursor() as cursor:
+            self._delete(cursor, [row[0] for row in rows])
+            self._insert(cursor, rows)
+
+    def remove_products(self, p_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(p_ids))
+
+    def rebuild(self, products, cursor=None):
+        if cursor is None:
+            with connection.cursor() as cursor:
+                return self.rebuild(products, cursor)
+        cursor.execute(f"DELETE FROM {self.table}")
+        batch = []
+        for row in product_documents(products):
+            batch.append(row)
+            if len(batch) >= INDEX_BATCH:
+                self._insert(cursor, batch)
+                batch = []
+        self._insert(cursor, batch)
+
+    def _delete(self, cursor, p_ids):
+        for start in range(0, len(p_ids), INDEX_BATCH):
+            chunk = p_ids[start:start + INDEX_BATCH]
+            cursor.execute(f"DELETE FROM {self.table} WHERE p_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+    def _insert(self, cursor, rows):
+        if rows:
+            cursor.executemany(f"INSERT INTO {self.table} VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Weighted tsvector per product in its own table with a GIN index, ranked
+    by ts_rank: name A, brand/category/sub-category B, colour C, description D.
+    """
+    table = "search_product_document"
+    config = "english"
+
+    def create(self, cursor):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                       "(p_id varchar(20) PRIMARY KEY, document tsvector NOT NULL)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_gin ON {self.table} USING GIN (document)")
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    @classmethod
+    def is_ready(cls, connection):
+        return cls.table in connection.introspection.table_names()
+
+    def search(self, query, limit=None, match_any=False):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        tsquery = (" | " if match_any else " & ").join(f"{term}:*" for term in terms)
+        sql = (f"SELECT p_id FROM {self.table}, to_tsquery('{self.config}', %s) query "
+               f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC, p_id")
+        params = [tsquery]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, products):
+        with connection.cursor() as cursor:
+            self._upsert(cursor, list(product_documents(products)))
+
+    def remove_products(self, p_ids):
+        p_ids = list(p_ids)
+        if p_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE p_id = ANY(%s)", [p_ids])
+
+    def rebuild(self, products, cursor=None):
+        if cursor is None:
+            with connection.cursor() as cursor:
+                return self.rebuild(products, cursor)
+        cursor.execute(f"TRUNCATE {self.table}")
+        batch = []
+        for row in product_documents(products):
+            batch.append(row)
+            if len(batch) >= INDEX_BATCH:
+                self._upsert(cursor, batch)
+                batch = []
+        self._upsert(cursor, batch)
+
+    def _upsert(self, cursor, rows):
+        if not rows:
+            return
+        config = self.config
+        cursor.executemany(
+            f"INSERT INTO {self.table} (p_id, document) VALUES (%s, "
+            f"setweight(to_tsvector('{config}', %s), 'A') || "
+            f"setweight(to_tsvector('{config}', %s || ' ' || %s || ' ' || %s), 'B') || "
+            f"setweight(to_tsvector('{config}', %s), 'C') || "
+            f"setweight(to_tsvector('{config}', %s), 'D')) "
+            "ON CONFLICT (p_id) DO UPDATE SET document = EXCLUDED.document",
+            rows,
+        )
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SqliteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+@lru_cache(maxsize=1)
+def get_search_backend():
+    """The configured backend, or the database's own one if its index table exists."""
+    if SEARCH_BACKEND:
+        return import_string(SEARCH_BACKEND)()
+    backend_class = VENDOR_BACKENDS.get(connection.vendor, IcontainsSearchBackend)
+    if not backend_class.is_ready(connection):
+        logger.warning("Search index for %s is missing; falling back to substring search. "
+                       "Run manage.py migrate search_app.", connection.vendor)
+        backend_class = IcontainsSearchBackend
+    return backend_class()
+
+
+def search_product_ids(query, limit=None, match_any=False):
+    """Ids of the products matching `query`, most relevant first."""
+    return get_search_backend().search(query, limit=limit, match_any=match_any)
@@ -0,0 +1,173 @@
+import hashlib
+from collections import Counter, namedtuple
+from django.core.cache import caches
+from django.db.models import Case, Count, IntegerField, Value, When
+from product_app.catalog import get_catalog_version
+from product_app.models import Products
+from .backends import query_terms
+
+# ------------------------------
+# Facets
+# ------------------------------
+# Counts for brand, category, colour and price bucket come from one GROUP BY
+# over all four, so a result set costs one aggregate query whatever the
+# number of facet values. Each facet is counted with the other facets'
+# selections applied but not its own, so picking a brand still shows the
+# other brands it could be switched to. The grouped rows are cached per
+# normalised query and catalog version, which makes refining a search free.
+FACETS = ("brand", "category", "color", "price")
+FACET_TITLES = {"brand": "Brand", "category": "Category", "color": "Colour", "price": "Price"}
+PRICE_BUCKETS = ((0, 5000), (5000, 10000), (10000, 25000), (25000, 50000), (50000, None))
+FACET_CACHE_TIMEOUT = 600
+# Ids per query in the p_id IN (...) filters, below every backend's parameter limit
+ID_CHUNK = 5000
+
+FacetRow = namedtuple("FacetRow", "brand category category_name color price count")
+search_cache = caches["search"]
+
+
+def price_bucket_label(index):
+    low, high = PRICE_BUCKETS[index]
+    if high is None:
+        return f"₹{low:,} and above"
+    if not low:
+        return f"Under ₹{high:,}"
+    return f"₹{low:,} - ₹{high:,}"
+
+
+def price_bucket():
+    """SQL expression numbering a product's PRICE_BUCKETS entry."""
+    whens = []
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        bounds = {"price__gte": low}
+        if high is not None:
+            bounds["price__lt"] = high
+        whens.append(When(then=Value(index), **bounds))
+    return Case(*whens, output_field=IntegerField())
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start:start + ID_CHUNK]
+
+
+def facet_rows(product_ids):
+    """[FacetRow] for the given products, from one grouped query per ID_CHUNK ids."""
+    totals = Counter()
+    for chunk in chunks(product_ids):
+        grouped = (Products.objects.filter(p_id__in=chunk)
+                   .annotate(price_bucket=price_bucket())
+                   .values_list("brand", "category_id", "category__category_name", "color", "price_bucket")
+                   .annotate(count=Count("p_id"))
+                   .order_by())
+        for *key, count in grouped:
+            totals[tuple(key)] += count
+    return [FacetRow(*key, count) for key, count in totals.items()]
+
+
+def query_digest(query):
+    """The normalised query as a cache key part: no spaces or odd characters, whatever its length."""
+    return hashlib.sha1(" ".join(query_terms(query)).encode()).hexdigest()
+
+
+def cached_facet_rows(query, product_ids):
+    """facet_rows for a text query's results, cached per normalised query and catalog version."""
+    key = f"facets:{get_catalog_version()}:{query_digest(query)}"
+    rows = search_cache.get(key)
+    if rows is None:
+        rows = facet_rows(product_ids)
+        search_cache.set(key, rows, FACET_CACHE_TIMEOUT)
+    return rows
+
+
+def selected_facets(params):
+    """{facet: value} picked in the request's GET parameters."""
+    selected = {}
+    for facet in FACETS:
+        value = params.get(facet)
+        if value:
+            selected[facet] = value
+    if "price" in selected:
+        if not selected["price"].isdigit() or int(selected["price"]) >= len(PRICE_BUCKETS):
+            del selected["price"]
+        else:
+            selected["price"] = int(selected["price"])
+    return selected
+
+
+def row_matches(row, selected, skip=None):
+    return all(getattr(row, facet) == value for facet, value in selected.items() if facet != skip)
+
+
+def facet_counts(rows, selected):
+    """
+    {facet: [(value, label, count)]}, most common first (price buckets in
+    order). A selected value stays listed even when nothing else matches it.
+    """
+    facets = {}
+    for facet in FACETS:
+        counts = Counter()
+        labels = {}
+        for row in rows:
+            value = getattr(row, facet)
+            if value in (None, ""):
+                continue
+            labels[value] = row.category_name if facet == "category" else value
+            if row_matches(row, selected, skip=facet):
+                counts[value] += row.count
+        if facet in selected and selected[facet] in labels:
+            counts[selected[facet]] += 0
+        if facet == "price":
+            entries = [(value, price_bucket_label(value), counts[value]) for value in sorted(counts)]
+        else:
+            entries = [(value, labels[value], count) for value, count in counts.most_common()]
+        facets[facet] = entries
+    return facets
+
+
+def filter_ids(product_ids, selected):
+    """The ids among product_ids that match every selected facet, order kept."""
+    if not selected:
+        return list(product_ids)
+    conditions = {}
+    for facet, value in selected.items():
+        if facet == "price":
+            low, high = PRICE_BUCKETS[value]
+            conditions["price__gte"] = low
+            if high is not None:
+                conditions["price__lt"] = high
+        elif facet == "category":
+            conditions["category_id"] = value
+        else:
+            conditions[facet] = value
+    matching = set()
+    for chunk in chunks(product_ids):
+        matching.update(Products.objects.filter(p_id__in=chunk, **conditions).values_list("p_id", flat=True))
+    return [pid for pid in product_ids if pid in matching]
+
+
+def facet_links(params, counts, selected):
+    """
+    Template-ready facets: [{name, title, values: [{label, count, url, selected}]}],
+    where url toggles that value in the current GET parameters. The
+    filtered results start again from their first page.
+    """
+    params = params.copy()
+    params.pop("cursor", None)
+    params.pop("format", None)
+    links = []
+    for facet, entries in counts.items():
+        values = []
+        for value, label, count in entries:
+            toggled = params.copy()
+            is_selected = selected.get(facet) == value
+            if is_selected:
+                toggled.pop(facet, None)
+            else:
+                toggled[facet] = str(value)
+            values.append({"label": label, "count": count, "selected": is_selected,
+                           "url": f"?{toggled.urlencode()}"})
+        if values:
+            links.append({"name": facet, "title": FACET_TITLES[facet], "values": values})
+    return links
@@ -0,0 +1,98 @@
+from collections import Counter
+from product_app.catalog import CatalogIndexRegistry
+from .backends import query_terms
+
+# ------------------------------
+# Typo tolerance
+# ------------------------------
+# A trigram inverted index over the words of product names, brands,
+# categories and sub-categories, the same measure pg_trgm uses. A query
+# that finds nothing has each unknown word swapped for the most similar
+# catalog word, found by looking up the word's trigrams instead of
+# comparing it with the whole vocabulary.
+MIN_SIMILARITY = 0.3
+MIN_WORD_LENGTH = 3
+
+
+def trigrams(word):
+    """pg_trgm-style trigrams: the word padded with two spaces in front and one behind."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def row_words(row):
+    text = " ".join(value or "" for value in (row.p_name, row.brand, row.category, row.sub_category))
+    return [word for word in query_terms(text) if len(word) >= MIN_WORD_LENGTH and not word.isdigit()]
+
+
+class TrigramIndex:
+    """Catalog words with how many products use them, and trigram -> words postings."""
+
+    def __init__(self, word_counts=None, postings=None, rows=None):
+        self.word_counts = word_counts or Counter()
+        self.postings = postings or {}
+        self.rows = rows or {}
+
+    def copy(self):
+        return TrigramIndex(Counter(self.word_counts),
+                            {gram: set(words) for gram, words in self.postings.items()}, self.rows)
+
+    def apply(self, rows):
+        """Bring the index in line with the current catalog rows ({p_id: CatalogRow})."""
+        for p_id, row in self.rows.items():
+            if rows.get(p_id) != row:
+                for word in row_words(row):
+                    self._remove(word)
+        for p_id, row in rows.items():
+            if self.rows.get(p_id) != row:
+                for word in row_words(row):
+                    self._add(word)
+        self.rows = rows
+
+    def _add(self, word):
+        if not self.word_counts[word]:
+            for gram in trigrams(word):
+                self.postings.setdefault(gram, set()).add(word)
+        self.word_counts[word] += 1
+
+    def _remove(self, word):
+        self.word_counts[word] -= 1
+        if self.word_counts[word] <= 0:
+            del self.word_counts[word]
+            for gram in trigrams(word):
+                self.postings[gram].discard(word)
+                if not self.postings[gram]:
+                    del self.postings[gram]
+
+    def __contains__(self, word):
+        return word in self.word_counts
+
+    def similar(self, word, limit=3, threshold=MIN_SIMILARITY):
+        """Catalog words most similar to `word` as [(word, similarity)], best first."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for candidate, common in shared.items():
+            similarity = common / (len(grams) + len(trigrams(candidate)) - common)
+            if similarity >= threshold:
+                scored.append((similarity, self.word_counts[candidate], candidate))
+        scored.sort(reverse=True)
+        return [(candidate, similarity) for similarity, _, candidate in scored[:limit]]
+
+    def correct(self, query):
+        """The query with unknown words replaced by their closest catalog word, or None if nothing changed."""
+        terms = query_terms(query)
+        corrected = []
+        for term in terms:
+            if term in self or len(term) < MIN_WORD_LENGTH or term.isdigit():
+                corrected.append(term)
+                continue
+            matches = self.similar(term, limit=1)
+            corrected.append(matches[0][0] if matches else term)
+        return " ".join(corrected) if corrected != terms else None
+
+
+spelling = CatalogIndexRegistry(TrigramIndex)
+
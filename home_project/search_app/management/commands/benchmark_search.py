@@ -0,0 +1,87 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from category_app.models import Category
+from sub_category_app.models import Sub_category
+from product_app.models import Products
+from search_app.backends import get_search_backend
+
+# Word pools for synthetic product names
+ADJECTIVES = ["wooden", "modern", "classic", "velvet", "rustic", "compact", "royal", "nordic",
+              "leather", "fabric", "marble", "glass", "metal", "cotton", "ceramic", "bamboo"]
+NOUNS = ["sofa", "bed", "wardrobe", "lamp", "table", "chair", "carpet", "curtain", "cabinet",
+         "mirror", "shelf", "stool", "recliner", "mattress", "vase", "clock"]
+COLORS = ["red", "blue", "grey", "white", "black", "brown", "beige", "green", "teal", "walnut"]
+BRANDS = ["Helios", "Ariana", "Nilkamal", "Durian", "Royaloak", "Wakefit", "Sleepwell", "Godrej"]
+
+
+class Command(BaseCommand):
+    help = ("Time the search backend against the previous icontains OR chain on a synthetic "
+            "catalog. The products are created inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000, help="Synthetic products to add.")
+        parser.add_argument("--repeats", type=int, default=20, help="Timed runs per query.")
+        parser.add_argument("--queries", default="sofa,wooden bed,helios,grey velvet recliner,lamp,zzz",
+                            help="Comma-separated queries.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            self.populate(options["products"])
+            started = time.perf_counter()
+            backend.rebuild(Products.objects.all())
+            self.stdout.write(f"{Products.objects.count()} products, indexed with "
+                              f"{backend.__class__.__name__} in {time.perf_counter() - started:.2f}s")
+
+            self.stdout.write(f"{'query':<26} {'hits':>6} {'icontains p50':>14} {'backend p50':>12} {'speedup':>8}")
+            for query in options["queries"].split(","):
+                legacy_ms, hits = self.time(lambda: legacy_search(query), options["repeats"])
+                backend_ms, _ = self.time(lambda: backend.search(query), options["repeats"])
+                self.stdout.write(f"{query:<26} {hits:>6} {legacy_ms:>11.2f} ms {backend_ms:>9.2f} ms "
+                                  f"{legacy_ms / max(backend_ms, 1e-6):>7.1f}x")
+            transaction.set_rollback(True)
+
+    def time(self, search, repeats):
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            hits = len(search())
+            timings.append((time.perf_counter() - started) * 1000)
+        return np.percentile(timings, 50), hits
+
+    def populate(self, n):
+        rng = np.random.default_rng(0)
+        categories = Category.objects.bulk_create(
+            [Category(category_id=f"BENCHC{i}", category_name=f"Bench {noun}") for i, noun in enumerate(NOUNS[:8])])
+        sub_categories = Sub_category.objects.bulk_create(
+            [Sub_category(sub_cat_id=f"BENCHS{i}", sub_cat_name=f"{adj} {NOUNS[i % 8]}"[:20],
+                          category=categories[i % 8]) for i, adj in enumerate(ADJECTIVES)])
+        products = []
+        for i in range(n):
+            sub = sub_categories[rng.integers(len(sub_categories))]
+            products.append(Products(
+                p_id=f"BENCH{i:06d}",
+                p_name=f"{rng.choice(ADJECTIVES)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                color=str(rng.choice(COLORS)),
+                brand=str(rng.choice(BRANDS)),
+                category_id=sub.category_id,
+                sub_category=sub,
+                description=f"{rng.choice(ADJECTIVES)} finish",
+                stock=10,
+                price=int(rng.integers(500, 90000)),
+            ))
+        Products.objects.bulk_create(products, batch_size=1000)
+
+
+def legacy_search(query):
+    """The icontains OR chain search_page used before the search backend."""
+    return list(Products.objects.filter(
+        Q(p_name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(category__category_name__icontains=query) |
+        Q(sub_category__sub_cat_name__icontains=query) |
+        Q(brand__icontains=query)
+    ).values_list("p_id", flat=True))
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from product_app.models import Products
+from search_app.backends import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from the catalog (needed after loaddata or bulk imports)."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.perf_counter()
+        with transaction.atomic():
+            backend.rebuild(Products.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Products.objects.count()} products with {backend.__class__.__name__} "
+            f"in {time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from search_app.backends import VENDOR_BACKENDS
+    backend_class = VENDOR_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is None:
+        return
+    backend = backend_class()
+    Products = apps.get_model('product_app', 'Products')
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        backend.rebuild(Products.objects.all(), cursor)
+
+
+def drop_index(apps, schema_editor):
+    from search_app.backends import VENDOR_BACKENDS
+    backend_class = VENDOR_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend_class().drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0002_similar_product'),
+        ('category_app', '0001_initial'),
+        ('sub_category_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,64 @@
+from collections import namedtuple
+from django.conf import settings
+from product_app.catalog import get_catalog_version
+from product_app.models import Product_image
+from .facets import query_digest, search_cache
+from .backends import query_terms, search_product_ids
+from .fuzzy import spelling
+from .semantic import semantic_index, synonyms
+
+# ------------------------------
+# Result cache
+# ------------------------------
+# The ranked ids of a text query, the spelling it was answered with, whether
+# they are only related products and the image of the top one, cached per normalised query and catalog version.
+# Any product change bumps the version, so entries never need invalidating;
+# they expire after SEARCH_CACHE_TIMEOUT and the "search" cache's
+# MAX_ENTRIES bounds how many are kept.
+SEARCH_CACHE_TIMEOUT = getattr(settings, "SEARCH_CACHE_TIMEOUT", 600)
+# Queries matching more than this are not cached: they are rare and costly to hold
+SEARCH_CACHE_MAX_IDS = getattr(settings, "SEARCH_CACHE_MAX_IDS", 5000)
+
+SearchResult = namedtuple("SearchResult", "ids corrected_query related image_url")
+
+
+def first_image_url(product_id):
+    name = (Product_image.objects.filter(p_id=product_id, image__isnull=False).exclude(image="")
+            .order_by("id").values_list("image", flat=True).first())
+    return Product_image._meta.get_field("image").storage.url(name) if name else None
+
+
+def search_ids(query, match_any=False):
+    """
+    (ids, corrected query or None, related) for a text query. What matches
+    as typed comes first; failing that, a word the catalog knows by another
+    name ("couch") goes to the TF-IDF index, a misspelt one ("sofaa") is
+    corrected, and anything still unmatched gets the TF-IDF index's closest
+    products, flagged as related.
+    """
+    ids = search_product_ids(query, match_any=match_any)
+    if ids:
+        return ids, None, False
+    # Trigram correction would turn "couch" into "coupe"
+    if synonyms(query_terms(query)):
+        ids = semantic_index.get().search(query)
+        if ids:
+            return ids, None, True
+    corrected = spelling.get().correct(query)
+    if corrected:
+        ids = search_product_ids(corrected, match_any=match_any)
+        if ids:
+            return ids, corrected, False
+    return semantic_index.get().search(query), None, True
+
+
+def cached_search(query, match_any=False):
+    """SearchResult for a text query, from the cache when the catalog has not changed."""
+    key = f"results:{get_catalog_version()}:{int(match_any)}:{query_digest(query)}"
+    result = search_cache.get(key)
+    if result is None:
+        ids, corrected_query, related = search_ids(query, match_any=match_any)
+        result = SearchResult(ids, corrected_query, related, first_image_url(ids[0]) if ids else None)
+        if len(ids) <= SEARCH_CACHE_MAX_IDS:
+            search_cache.set(key, result, SEARCH_CACHE_TIMEOUT)
+    return result
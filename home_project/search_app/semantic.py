@@ -0,0 +1,169 @@
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize as l2_normalize
+from product_app.catalog import CatalogIndexRegistry
+from .backends import query_terms
+
+# ------------------------------
+# TF-IDF retrieval
+# ------------------------------
+# Every product's text (name, brand, category, sub-category, colour,
+# description) as one row of a sparse TF-IDF matrix. Word features match
+# whole terms; character 3-5-grams match partial words and misspellings.
+# Queries are expanded through SYNONYMS first, so "couch" finds sofas.
+# A query is vectorised straight from the fitted vocabularies and scored
+# against a feature-major copy of the matrix, so only the postings of its
+# own terms and n-grams are touched. The matrix is built on first
+# use; after a catalog change only the changed products are transformed,
+# with the vocabulary and IDF weights refitted once more than
+# REFIT_FRACTION of the catalog has changed since the last fit.
+WORD_WEIGHT = 0.6
+CHAR_WEIGHT = 0.4
+# Character n-grams give everything some similarity; below this is noise
+MIN_SCORE = 0.15
+REFIT_FRACTION = 0.25
+
+SYNONYMS = {
+    "couch": "sofa", "settee": "sofa", "sectional": "sofa", "loveseat": "sofa", "divan": "sofa",
+    "cupboard": "wardrobe", "almirah": "wardrobe", "closet": "wardrobe", "armoire": "wardrobe",
+    "nightstand": "bed side table", "cot": "bed", "mattress": "bed",
+    "carpet": "rug", "dhurrie": "rug", "drape": "curtain", "blind": "curtain",
+    "chandelier": "ceiling light", "pendant": "ceiling light",
+    "pot": "cookware", "pan": "cookware", "utensil": "cookware", "kadai": "cookware",
+    "cutlery": "kitchenware", "dinnerware": "crockery", "plate": "crockery",
+    "television": "tv unit", "painting": "wall art", "poster": "wall art", "frame": "wall art",
+    "stool": "chair", "armchair": "chair", "desk": "table",
+}
+
+
+def document(row):
+    return " ".join(value for value in (row.p_name, row.brand, row.category, row.sub_category,
+                                        row.color, row.description) if value)
+
+
+def synonyms(terms):
+    """The catalog words for any of the terms known by another name ("couches" gives "sofa")."""
+    found = []
+    for term in terms:
+        synonym = SYNONYMS.get(term) or (term.endswith("s") and SYNONYMS.get(term[:-1]))
+        if synonym:
+            found.append(synonym)
+    return found
+
+
+def expand_query(query):
+    """The query's terms followed by their synonyms."""
+    terms = query_terms(query)
+    return " ".join(terms + synonyms(terms))
+
+
+class TfidfIndex:
+    """The TF-IDF matrix with one row per product; `ids[i]` is row i's p_id."""
+
+    def __init__(self):
+        self.word = None
+        self.char = None
+        self.matrix = None
+        self.by_feature = None
+        self.analyzers = ()
+        self.ids = []
+        self.row_of = {}
+        self.rows = {}
+        self.changed_since_fit = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copy(self):
+        # The matrix and vectorizers are replaced, never modified, so sharing them is safe
+        index = TfidfIndex()
+        index.__dict__.update(self.__dict__)
+        return index
+
+    def apply(self, rows):
+        """Bring the matrix in line with the current catalog rows ({p_id: CatalogRow})."""
+        changed = [p_id for p_id, row in rows.items() if self.rows.get(p_id) != row]
+        removed = sum(1 for p_id in self.rows if p_id not in rows)
+        if not changed and not removed:
+            self.rows = rows
+            return
+        self.changed_since_fit += len(changed) + removed
+        if self.matrix is None or self.changed_since_fit > len(rows) * REFIT_FRACTION:
+            self.fit(rows)
+            return
+        changed_set = set(changed)
+        kept = [p_id for p_id in self.ids if p_id in rows and p_id not in changed_set]
+        parts = [self.matrix[[self.row_of[p_id] for p_id in kept]]]
+        if changed:
+            parts.append(self.transform([document(rows[p_id]) for p_id in changed]))
+        self.set_matrix(sp.vstack(parts, format="csr"), kept + changed)
+        self.rows = rows
+
+    def fit(self, rows):
+        ids = sorted(rows)
+        self.rows = rows
+        self.changed_since_fit = 0
+        if not ids:
+            self.word = self.char = self.matrix = self.by_feature = None
+            self.analyzers = ()
+            self.ids, self.row_of = [], {}
+            return
+        documents = [document(rows[p_id]) for p_id in ids]
+        self.word = TfidfVectorizer(token_pattern=r"(?u)\b\w+\b", sublinear_tf=True)
+        self.char = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True)
+        matrix = sp.hstack([WORD_WEIGHT * self.word.fit_transform(documents),
+                            CHAR_WEIGHT * self.char.fit_transform(documents)], format="csr")
+        self.analyzers = ((self.word, self.word.build_analyzer(), 0, WORD_WEIGHT),
+                          (self.char, self.char.build_analyzer(), len(self.word.vocabulary_), CHAR_WEIGHT))
+        self.set_matrix(l2_normalize(matrix), ids)
+
+    def set_matrix(self, matrix, ids):
+        self.matrix = matrix.astype(np.float32)
+        self.by_feature = self.matrix.T.tocsr()
+        self.ids = ids
+        self.row_of = {p_id: i for i, p_id in enumerate(ids)}
+
+    def transform(self, documents):
+        matrix = sp.hstack([WORD_WEIGHT * self.word.transform(documents),
+                            CHAR_WEIGHT * self.char.transform(documents)], format="csr")
+        return l2_normalize(matrix)
+
+    def query_vector(self, query):
+        """(feature columns, weights) of the query, weighted and normalised as the rows are."""
+        text = expand_query(query)
+        columns, weights = [], []
+        for vectorizer, analyzer, offset, block_weight in self.analyzers:
+            counts = Counter(term for term in analyzer(text) if term in vectorizer.vocabulary_)
+            if not counts:
+                continue
+            block = np.fromiter((vectorizer.vocabulary_[term] for term in counts), dtype=np.int64, count=len(counts))
+            values = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * vectorizer.idf_[block]
+            columns.append(block + offset)
+            weights.append(block_weight * values / np.linalg.norm(values))
+        if not columns:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        weights = np.concatenate(weights)
+        return np.concatenate(columns), weights / np.linalg.norm(weights)
+
+    def scores(self, query):
+        """Cosine similarity of every row to the (synonym-expanded) query."""
+        if self.matrix is None:
+            return np.zeros(0, dtype=np.float32)
+        columns, weights = self.query_vector(query)
+        if not len(columns):
+            return np.zeros(len(self.ids), dtype=np.float32)
+        return self.by_feature[columns].T @ weights.astype(np.float32)
+
+    def search(self, query, limit=None, min_score=MIN_SCORE):
+        """p_ids scoring at least min_score, best first."""
+        scores = self.scores(query)
+        rows = np.flatnonzero(scores >= min_score)
+        if limit is not None and len(rows) > limit:
+            rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [self.ids[i] for i in rows]
+
+
+semantic_index = CatalogIndexRegistry(TfidfIndex)
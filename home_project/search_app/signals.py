@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete
+from category_app.models import Category
+from sub_category_app.models import Sub_category
+from product_app.models import Products
+from .backends import get_search_backend
+
+# Keep the search index in step with the catalog. Fixture loading (raw=True)
+# is skipped; run `manage.py rebuild_search_index` after loaddata.
+
+
+def product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products(Products.objects.filter(pk=instance.pk))
+
+
+def product_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+def category_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products(Products.objects.filter(category=instance))
+
+
+def sub_category_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products(Products.objects.filter(sub_category=instance))
+
+
+post_save.connect(product_saved, sender=Products, dispatch_uid="search_product_saved")
+post_delete.connect(product_deleted, sender=Products, dispatch_uid="search_product_deleted")
+post_save.connect(category_saved, sender=Category, dispatch_uid="search_category_saved")
+post_save.connect(sub_category_saved, sender=Sub_category, dispatch_uid="search_sub_category_saved")
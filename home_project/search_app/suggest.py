@@ -0,0 +1,141 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter, namedtuple
+from django.urls import reverse
+from product_app.catalog import CatalogIndexRegistry
+from .backends import query_terms
+
+# ------------------------------
+# Autocomplete
+# ------------------------------
+# Suggestions (product names, brands, categories, sub-categories) live in a
+# sorted list of (key, word position, suggestion), where the keys are the
+# suggestion text starting at each of its words. Completing "king si" is a
+# bisect to the first key >= "king si" and a short walk while keys still
+# start with it. Nothing touches the database until the catalog version
+# changes, and then only the products that changed are re-indexed.
+SUGGEST_LIMIT = 8
+# Products matching a prefix can number in the thousands; only this many
+# are looked at. Brands and categories are few and always all considered.
+MAX_PRODUCT_SCAN = 100
+KIND_ORDER = {"category": 0, "sub_category": 1, "brand": 2, "product": 3}
+
+Suggestion = namedtuple("Suggestion", "kind value text")
+
+
+def normalize(text):
+    return " ".join(query_terms(text))
+
+
+def row_suggestions(row):
+    """The suggestions one product contributes."""
+    suggestions = [Suggestion("product", row.p_id, row.p_name)]
+    if row.brand:
+        suggestions.append(Suggestion("brand", row.brand, row.brand))
+    if row.category:
+        suggestions.append(Suggestion("category", row.category_id, row.category))
+    if row.sub_category:
+        suggestions.append(Suggestion("sub_category", (row.category_id, row.sub_category_id), row.sub_category))
+    return suggestions
+
+
+def suggestion_keys(suggestion):
+    """(key, word position) for every word the suggestion can be completed from."""
+    words = normalize(suggestion.text).split()
+    keys = {}
+    for i in range(len(words)):
+        keys.setdefault(" ".join(words[i:]), i)
+    return keys.items()
+
+
+def group(suggestion):
+    return "product" if suggestion.kind == "product" else "facet"
+
+
+def suggestion_url(suggestion):
+    if suggestion.kind == "product":
+        return reverse("product_details", args=[suggestion.value])
+    if suggestion.kind == "brand":
+        return reverse("brand_products", args=[suggestion.value])
+    if suggestion.kind == "category":
+        return reverse("product_page", args=[suggestion.value])
+    return reverse("product_page", args=list(suggestion.value))
+
+
+class PrefixIndex:
+    """
+    Sorted (key, word position, suggestion) triples, one list for products
+    and one for brands and categories, plus how many products back each
+    suggestion; a brand or category goes with its last product.
+    """
+
+    def __init__(self, pairs=None, counts=None, rows=None):
+        self.pairs = pairs or {"facet": [], "product": []}
+        self.counts = counts or Counter()
+        self.rows = rows or {}
+
+    def __len__(self):
+        return sum(len(pairs) for pairs in self.pairs.values())
+
+    def copy(self):
+        return PrefixIndex({name: list(pairs) for name, pairs in self.pairs.items()}, Counter(self.counts), self.rows)
+
+    def apply(self, rows):
+        """Bring the index in line with the current catalog rows ({p_id: CatalogRow})."""
+        removed = [row for p_id, row in self.rows.items() if rows.get(p_id) != row]
+        added = [row for p_id, row in rows.items() if self.rows.get(p_id) != row]
+        if len(removed) + len(added) > len(rows) // 4:
+            self.rebuild(rows)
+            return
+        for row in removed:
+            for suggestion in row_suggestions(row):
+                self.counts[suggestion] -= 1
+                if not self.counts[suggestion]:
+                    del self.counts[suggestion]
+                    pairs = self.pairs[group(suggestion)]
+                    for key, position in suggestion_keys(suggestion):
+                        del pairs[bisect_left(pairs, (key, position, suggestion))]
+        for row in added:
+            for suggestion in row_suggestions(row):
+                if not self.counts[suggestion]:
+                    for key, position in suggestion_keys(suggestion):
+                        insort(self.pairs[group(suggestion)], (key, position, suggestion))
+                self.counts[suggestion] += 1
+        self.rows = rows
+
+    def rebuild(self, rows):
+        self.counts = Counter(s for row in rows.values() for s in row_suggestions(row))
+        self.pairs = {"facet": [], "product": []}
+        for s in self.counts:
+            self.pairs[group(s)].extend((key, position, s) for key, position in suggestion_keys(s))
+        for pairs in self.pairs.values():
+            pairs.sort()
+        self.rows = rows
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        later_word = {}
+        for name, pairs in self.pairs.items():
+            start = bisect_left(pairs, (prefix,))
+            end = min(len(pairs), start + MAX_PRODUCT_SCAN) if name == "product" else len(pairs)
+            for i in range(start, end):
+                key, position, suggestion = pairs[i]
+                if not key.startswith(prefix):
+                    break
+                later_word[suggestion] = later_word.get(suggestion, True) and position > 0
+        # A match on the first word beats one on a later word
+        counts = self.counts
+        return heapq.nsmallest(limit, later_word, key=lambda s: (later_word[s], KIND_ORDER[s.kind], -counts[s], s.text))
+
+
+suggestions = CatalogIndexRegistry(PrefixIndex)
+
+
+def suggest(prefix, limit=SUGGEST_LIMIT):
+    return suggestions.get().suggest(prefix, limit)
+
+
+async def asuggest(prefix, limit=SUGGEST_LIMIT):
+    return (await suggestions.aget()).suggest(prefix, limit)
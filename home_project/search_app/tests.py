@@ -0,0 +1,36 @@
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from category_app.models import Category
+from product_app.models import Products
+from sub_category_app.models import Sub_category
+
+
+class FacetLinkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(category_id="LIV", category_name="Living")
+        sub_category = Sub_category.objects.create(sub_cat_id="SOF", sub_cat_name="Sofas", category=category)
+        # More than a page of matches, every third one by Helios
+        for n in range(30):
+            Products.objects.create(
+                p_id=f"P{n:03}", p_name=f"Sofa Set {n}", brand="Helios" if n % 3 == 0 else "Melody",
+                category=category, sub_category=sub_category, stock=5, price=1000 + n)
+
+    def setUp(self):
+        caches["search"].clear()
+
+    def test_facet_link_from_a_later_page_starts_from_the_first(self):
+        first = self.client.get(reverse("search_page"), {"q": "set"})
+        self.assertIn("cursor", first.context["next_url"])
+        second = self.client.get(reverse("search_page") + first.context["next_url"])
+
+        brand = next(facet for facet in second.context["facets"] if facet["name"] == "brand")
+        helios = next(value for value in brand["values"] if value["label"] == "Helios")
+        self.assertNotIn("cursor", parse_qs(urlparse(helios["url"]).query))
+
+        filtered = self.client.get(reverse("search_page") + helios["url"])
+        self.assertEqual(helios["count"], 10)
+        self.assertEqual(len(filtered.context["products"]), helios["count"])
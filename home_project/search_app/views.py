@@ -0,0 +1,14 @@
+from django.http import JsonResponse
+from .suggest import asuggest, suggestion_url
+
+
+async def suggest_view(request):
+    """Autocomplete for the search box, answered from the in-memory prefix index without a thread."""
+    query = request.GET.get("q", "")
+    return JsonResponse({
+        "query": query,
+        "suggestions": [
+            {"text": s.text, "type": s.kind, "url": suggestion_url(s)}
+            for s in await asuggest(query)
+        ],
+    })
@@ -0,0 +1,115 @@
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from .embedding_store import normalize_rows
+
+
+# ------------------------------
+# Approximate nearest neighbours
+# ------------------------------
+class IVFIndex:
+    """
+    Inverted-file index over k-means centroids of unit-normalised vectors.
+
+    Every vector is assigned to its nearest centroid. A query only looks at
+    the vectors in its `nprobe` closest lists, so the cost grows with
+    nprobe * n / n_lists instead of n.
+
+    Lists are stored CSR-style: the row numbers of list j are
+    members[offsets[j]:offsets[j + 1]].
+    """
+
+    def __init__(self, centroids, offsets, members, ids, nprobe=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.members = np.asarray(members, dtype=np.int64)
+        self.ids = np.asarray(ids)
+        self.nprobe = nprobe or default_nprobe(len(self.centroids))
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, ids, n_lists=None, nprobe=None, seed=0):
+        """Cluster unit-normalised `vectors` (rows aligned with `ids`) into inverted lists."""
+        vectors = normalize_rows(vectors)
+        n_lists = min(n_lists or default_n_lists(len(vectors)), len(vectors))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3,
+                                 batch_size=max(1024, 4 * n_lists))
+        assignments = kmeans.fit_predict(vectors)
+        centroids = normalize_rows(kmeans.cluster_centers_)
+
+        members = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, offsets, members, ids, nprobe)
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, offsets=self.offsets,
+                 members=self.members, ids=self.ids, nprobe=self.nprobe)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["centroids"], data["offsets"], data["members"],
+                       data["ids"], int(data["nprobe"]))
+
+    def remap(self, pid_to_row):
+        """
+        Return a copy whose members are rows of another matrix, given its
+        {product id: row} mapping. Ids missing from the mapping are dropped.
+        """
+        rows = np.array([pid_to_row.get(pid, -1) for pid in self.ids], dtype=np.int64)
+        mapped = rows[self.members]
+        keep = mapped >= 0
+        list_of_member = np.repeat(np.arange(self.n_lists), np.diff(self.offsets))
+        counts = np.bincount(list_of_member[keep], minlength=self.n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        row_ids = np.array(sorted(pid_to_row, key=pid_to_row.get))
+        return IVFIndex(self.centroids, offsets, mapped[keep], row_ids, self.nprobe)
+
+    def candidates(self, query, nprobe=None):
+        """Row numbers of every vector in the lists closest to `query`."""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ np.asarray(query, dtype=np.float32)
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+        return np.concatenate([self.members[self.offsets[j]:self.offsets[j + 1]] for j in lists])
+
+    def search(self, vectors, query, k, nprobe=None):
+        """
+        Approximate top-k rows of the unit-normalised `vectors` by inner
+        product with `query`. Returns (rows, scores), best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        rows = self.candidates(query, nprobe)
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        scores = vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+
+def default_n_lists(n):
+    """About sqrt(n) lists, the usual starting point for IVF."""
+    return max(1, int(np.sqrt(n)))
+
+
+def default_nprobe(n_lists):
+    return max(1, n_lists // 16)
+
+
+def exact_search(vectors, query, k):
+    """Exact top-k by inner product; the baseline the index is measured against."""
+    scores = vectors @ np.asarray(query, dtype=np.float32)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, scores[top]
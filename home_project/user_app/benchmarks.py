@@ -0,0 +1,93 @@
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from .ann import default_n_lists
+
+# ------------------------------
+# Synthetic data for benchmarks and reports
+# ------------------------------
+# Nothing here touches the database, so benchmarks can run at catalog sizes
+# far beyond the real one.
+
+
+def synthetic_embeddings(n, dim, n_clusters=None, seed=0):
+    """Clustered gaussian vectors, roughly shaped like product image embeddings."""
+    rng = np.random.default_rng(seed)
+    n_clusters = n_clusters or default_n_lists(n)
+    centres = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centres[labels] + 2.0 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def synthetic_catalog(n, dim, n_categories=10, n_brands=50, seed=0):
+    """Return (embeddings, ids, {id: (category_id, brand)}) for n products."""
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"SYN{i:06d}" for i in range(n)])
+    categories = rng.integers(0, n_categories, size=n)
+    brands = rng.integers(0, n_brands, size=n)
+    attributes = {pid: (f"C{c:03d}", f"Brand{b}") for pid, c, b in zip(ids, categories, brands)}
+    return synthetic_embeddings(n, dim, seed=seed), ids, attributes
+
+
+def synthetic_signals(ids, rng, size=20):
+    """Random wishlist, cart and order product id sets for one user."""
+    picks = [set(rng.choice(ids, size=size, replace=False).tolist()) for _ in range(3)]
+    return tuple(picks)
+
+
+def preference_weights(attributes, wishlist, cart, orders):
+    """{(category_id, brand): weight}, as get_user_preference_similarity builds it."""
+    prefs = {}
+    for pid in wishlist | cart | orders:
+        weight = (pid in wishlist) * 1 + (pid in cart) * 2 + (pid in orders) * 3
+        key = attributes[pid]
+        prefs[key] = prefs.get(key, 0) + weight
+    return prefs
+
+
+# ------------------------------
+# Reference implementation
+# ------------------------------
+def legacy_recommendations(embeddings, ids, attributes, history, signals, top_k=6,
+                           w_image=0.4, w_catbrand=0.2, w_history=0.2, w_user=0.2):
+    """
+    The original per-history-item scoring loop (cosine_similarity per item,
+    Python loops for category/brand and preferences, full argsort), kept so
+    new scoring paths can be timed against it.
+    """
+    pid_to_index = {pid: i for i, pid in enumerate(ids)}
+    scores = np.zeros(len(ids))
+
+    for pid in history:
+        idx = pid_to_index.get(pid)
+        if idx is not None:
+            scores += w_image * cosine_similarity(embeddings[idx].reshape(1, -1), embeddings)[0]
+
+    for pid in history:
+        target = attributes.get(pid)
+        if target is None:
+            continue
+        sims = []
+        for db_pid in ids:
+            p = attributes.get(db_pid)
+            score = 0
+            if p is not None:
+                if p[0] == target[0]:
+                    score += 0.6
+                if p[1] == target[1]:
+                    score += 0.4
+            sims.append(score)
+        scores += w_catbrand * np.array(sims)
+
+    for i, pid in enumerate(history):
+        idx = pid_to_index.get(pid)
+        if idx is not None:
+            scores[idx] += w_history * (1 - i / len(history))
+
+    if signals is not None:
+        prefs = preference_weights(attributes, *signals)
+        scores += w_user * np.array([prefs.get(attributes.get(pid), 0) for pid in ids])
+
+    history_indices = [pid_to_index[pid] for pid in history if pid in pid_to_index]
+    scores[history_indices] = -np.inf
+    top = np.argsort(scores)[::-1][:top_k]
+    return [str(ids[i]) for i in top]
@@ -1,31 +1,37 @@
-import numpy as np
-from tensorflow.keras.preprocessing import image as keras_image
-from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input
-from tensorflow.keras.models import Model
+import os
+import sys
+import django
 
-# Load model (as in your app.py)
-base_model = ResNet50(weights='imagenet', include_top=False, pooling='avg')
-model = Model(inputs=base_model.input, outputs=base_model.output)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "home_project.settings")
+django.setup()
 
-# 1. Load the embeddings file
-product_embeddings = np.load("user_app/product_embeddings.npy")
-print("Product Embeddings:")
-print(f"  Shape: {product_embeddings.shape}")
-print(f"  Data Type: {product_embeddings.dtype}")
+from product_app.models import Products
+from user_app.embedding_model import load_model, load_image, embed
+from user_app.utils import load_embedding_store, check_embedding_artifact
 
-# 2. Get a sample embedding for a test image
-# Replace 'test_image.jpg' with the path to a test image you're using
-try:
-    test_img = keras_image.load_img("/media/product_image/1000013983203-1000013983203-2709_01-2100.jpg", target_size=(224, 224))
-    x = keras_image.img_to_array(test_img)
-    x = np.expand_dims(x, axis=0)
-    x = preprocess_input(x)
-    query_embedding = model.predict(x).flatten()
-except FileNotFoundError:
-    print("Test image not found. Skipping query embedding check.")
-    query_embedding = None
+# 1. Load the embedding artifact and compare it with the live catalog
+store = load_embedding_store()
+if store is None:
+    sys.exit("No embedding artifact found. Please run manage.py build_embeddings.")
 
-if query_embedding is not None:
+print("Embedding artifact:")
+for key, value in store.manifest.items():
+    print(f"  {key}: {value}")
+
+status = check_embedding_artifact(store, set(Products.objects.values_list('p_id', flat=True)))
+print(f"  compatible with current model: {status.compatible}")
+print(f"  products without vectors: {sorted(status.missing_ids)}")
+print(f"  vectors for deleted products: {sorted(status.extra_ids)}")
+print(f"  vectors for replaced images: {sorted(status.changed_ids)}")
+
+# 2. Get a sample embedding for a test image, with the same model and preprocessing
+# Pass the path of a test image as the first argument
+if len(sys.argv) > 1:
+    query_embedding = embed(load_model(), [load_image(sys.argv[1])])[0]
     print("\nQuery Embedding:")
     print(f"  Shape: {query_embedding.shape}")
-    print(f"  Data Type: {query_embedding.dtype}")
\ No newline at end of file
+    print(f"  Data Type: {query_embedding.dtype}")
+    if query_embedding.shape[0] != store.dim:
+        print(f"  ⚠️ Dimension {query_embedding.shape[0]} does not match artifact dimension {store.dim}")
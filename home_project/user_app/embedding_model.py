@@ -0,0 +1,62 @@
+import numpy as np
+
+# ------------------------------
+# Image embedding model
+# ------------------------------
+# The one definition of how product and query images are embedded. Every
+# artifact records these values in its manifest, and vectors made with a
+# different model or preprocessing are never compared with each other.
+MODEL_NAME = "MobileNetV2"
+INPUT_SIZE = 224
+PREPROCESSING = "mobilenet_v2.preprocess_input"
+EMBEDDING_DIM = 1280
+
+
+def model_metadata():
+    return {"model": MODEL_NAME, "input_size": INPUT_SIZE, "preprocessing": PREPROCESSING}
+
+
+def load_model():
+    """Load MobileNetV2 (ImageNet weights, global average pooling). TensorFlow is imported here."""
+    from tensorflow.keras.applications import MobileNetV2
+    return MobileNetV2(weights='imagenet', include_top=False, pooling='avg')
+
+
+def load_image(source):
+    """Decode and resize an image path or file object to an INPUT_SIZE x INPUT_SIZE RGB array."""
+    from tensorflow.keras.preprocessing import image as keras_image
+    img = keras_image.load_img(source, target_size=(INPUT_SIZE, INPUT_SIZE))
+    return keras_image.img_to_array(img)
+
+
+def embed(model, images):
+    """Embed a batch of arrays from load_image(); returns float32 rows."""
+    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+    batch = preprocess_input(np.stack(images).astype(np.float32))
+    return model.predict(batch, verbose=0).astype(np.float32)
+
+
+# ------------------------------
+# Warm model for worker processes
+# ------------------------------
+# Used as the initializer and task of the image search service's process
+# pool (user_app.image_search). Nothing here imports Django, so the pool
+# can use the "spawn" start method.
+_worker_model = None
+
+
+def warm_up():
+    """Load the model once per worker process and run one prediction so the first query is fast."""
+    global _worker_model
+    _worker_model = load_model()
+    embed(_worker_model, [np.zeros((INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)])
+
+
+def embed_bytes(data):
+    """Embed an encoded image (bytes) with the worker's model; returns one unit-length float32 vector."""
+    import io
+    if _worker_model is None:
+        warm_up()
+    vector = embed(_worker_model, [load_image(io.BytesIO(data))])[0]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
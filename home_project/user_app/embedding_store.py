@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+import numpy as np
+
+# ------------------------------
+# Embedding store
+# ------------------------------
+# The single, versioned artifact holding unit-normalised product embeddings:
+#
+#   manifest.json   artifact_version, dtype, count, dim, model, input_size,
+#                   preprocessing, catalog_checksum, created_at
+#   ids.npy         product ids, row-aligned with vectors
+#   images.npy      name of the image each vector was made from
+#   vectors.npy     float32, float16 or int8 rows
+#   scales.npy      int8 only: one float32 scale per row
+#   ann_index.npz   optional IVF index over these vectors (build_ann_index)
+#
+# The .npy files are opened with mmap_mode='r', so gunicorn workers on the
+# same host share one copy through the OS page cache instead of each
+# holding a private float32 array.
+STORE_FORMAT = 1
+STORE_DTYPES = ("float32", "float16", "int8")
+CHUNK_ROWS = 1024
+
+
+class EmbeddingStore:
+    """Read-only, row-addressable view of stored embeddings."""
+
+    def __init__(self, vectors, ids, scales=None, manifest=None, image_names=None):
+        self.vectors = vectors
+        self.ids = ids
+        self.scales = scales
+        self.image_names = image_names
+        self.manifest = manifest or {}
+        self.dtype = str(vectors.dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def version(self):
+        return self.manifest.get("artifact_version")
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        mode = "r" if mmap else None
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        ids = np.load(os.path.join(path, "ids.npy"))
+        scales = image_names = None
+        if manifest["dtype"] == "int8":
+            scales = np.load(os.path.join(path, "scales.npy"), mmap_mode=mode)
+        if os.path.exists(os.path.join(path, "images.npy")):
+            image_names = np.load(os.path.join(path, "images.npy"))
+        return cls(vectors, ids, scales, manifest, image_names)
+
+    @classmethod
+    def from_array(cls, embeddings, ids):
+        """Wrap an in-memory float32 matrix; rows are normalised on the way in."""
+        vectors = normalize_rows(embeddings)
+        return cls(vectors, np.asarray(ids), manifest={"dtype": "float32"})
+
+    def _dequantize(self, block, rows):
+        block = block.astype(np.float32, copy=False)
+        if self.scales is not None:
+            block = block * self.scales[rows][:, None]
+        return block
+
+    def rows(self, indices):
+        """float32 vectors for the given row numbers."""
+        indices = np.asarray(indices, dtype=np.intp)
+        return self._dequantize(self.vectors[indices], indices)
+
+    def dot(self, query, rows=None):
+        """
+        Inner product of `query` with every stored row (or only `rows`).
+        Quantised rows are widened a chunk at a time, so memory stays bounded.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if rows is not None:
+            return self.rows(rows) @ query
+        if self.scales is None and self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), CHUNK_ROWS):
+            block = slice(start, start + CHUNK_ROWS)
+            scores[block] = self.vectors[block].astype(np.float32) @ query
+        if self.scales is not None:
+            # Scaling the scores is the same as scaling every row first, and cheaper
+            scores *= self.scales
+        return scores
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2:
+        return vectors.reshape(len(vectors), 0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+def quantize(vectors, dtype):
+    """Return (stored vectors, per-row scales or None) for a store dtype."""
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"Unsupported embedding store dtype {dtype!r}; use one of {STORE_DTYPES}.")
+    vectors = normalize_rows(vectors)
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return vectors.astype(dtype), None
+
+
+def catalog_checksum(entries):
+    """
+    Checksum of the (product id, image name) pairs the vectors were made
+    from, so a changed, added or removed product image shows up as a
+    mismatch.
+    """
+    digest = hashlib.sha1()
+    for p_id, image_name in sorted(entries):
+        digest.update(f"{p_id}\t{image_name}\n".encode())
+    return digest.hexdigest()
+
+
+def write_embedding_store(path, embeddings, ids, dtype="float32", image_names=None, keep=(),
+                          **extra_manifest):
+    """
+    Write a store directory, replacing any existing one only once the new
+    files are complete so readers never open a half-written store.
+
+    Files of the old store named in `keep` (such as ann_index.npz) are
+    copied into the new one; everything else in it is replaced.
+    `extra_manifest` should carry the model metadata (see
+    user_app.embedding_model.model_metadata) and the catalog_checksum.
+    """
+    vectors, scales = quantize(embeddings, dtype)
+    ids = np.asarray(ids).astype(str)
+    content = hashlib.sha1(ids.tobytes())
+    content.update(vectors.tobytes())
+    manifest = {
+        "format": STORE_FORMAT,
+        "artifact_version": content.hexdigest()[:16],
+        "dtype": dtype,
+        "count": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **extra_manifest,
+    }
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "vectors.npy"), vectors)
+    np.save(os.path.join(tmp_path, "ids.npy"), ids)
+    if image_names is not None:
+        np.save(os.path.join(tmp_path, "images.npy"), np.asarray(image_names).astype(str))
+    if scales is not None:
+        np.save(os.path.join(tmp_path, "scales.npy"), scales)
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+    for name in keep:
+        if os.path.exists(os.path.join(path, name)):
+            shutil.copy2(os.path.join(path, name), os.path.join(tmp_path, name))
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
@@ -1,5 +1,13 @@
-
 from django import forms
+from .image_search import IMAGE_SEARCH_MAX_BYTES
 
 class ImageSearchForm(forms.Form):
     image = forms.ImageField(required=True)
+
+    def clean_image(self):
+        # Rejected before it is stored as a job, not later by the worker
+        image = self.cleaned_data["image"]
+        if image.size > IMAGE_SEARCH_MAX_BYTES:
+            raise forms.ValidationError(
+                f"Please upload an image smaller than {IMAGE_SEARCH_MAX_BYTES // (1024 * 1024)} MB.")
+        return image
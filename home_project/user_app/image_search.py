@@ -0,0 +1,209 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from PIL import Image, UnidentifiedImageError
+from .embedding_model import MODEL_NAME, PREPROCESSING, embed_bytes, warm_up
+from .utils import load_embedding_store, recommender
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Image search service
+# ------------------------------
+# `manage.py run_image_search` keeps the embedding model warm in a small
+# process pool and answers queries over a local multiprocessing connection.
+# Web workers only send the uploaded bytes and wait for product ids, so they
+# never import TensorFlow or block on the network.
+#
+# IMAGE_SEARCH_ADDRESS is a (host, port) pair or a Unix socket path.
+IMAGE_SEARCH_ADDRESS = getattr(settings, "IMAGE_SEARCH_ADDRESS", ("127.0.0.1", 6011))
+IMAGE_SEARCH_AUTHKEY = getattr(settings, "IMAGE_SEARCH_AUTHKEY", settings.SECRET_KEY).encode()
+IMAGE_SEARCH_WORKERS = getattr(settings, "IMAGE_SEARCH_WORKERS", 1)
+IMAGE_SEARCH_TIMEOUT = getattr(settings, "IMAGE_SEARCH_TIMEOUT", 15)
+IMAGE_SEARCH_MAX_BYTES = getattr(settings, "IMAGE_SEARCH_MAX_BYTES", 10 * 1024 * 1024)
+
+
+class ImageSearchUnavailable(Exception):
+    """The image search service is not running, timed out or could not read the image."""
+
+
+# ------------------------------
+# Query cache
+# ------------------------------
+# Content-addressed: an upload is identified by the sha256 of its bytes and,
+# so that a re-saved copy of the same picture also hits, of a
+# small quantised greyscale thumbnail. Embeddings are keyed by the model
+# that made them; top-k results by the artifact version they were matched
+# against, so rebuilding the artifact invalidates them.
+query_cache = caches["image_search"]
+THUMBNAIL_SIZE = 16
+
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def thumbnail_digest(data):
+    """sha256 of the normalised thumbnail, or None if the image does not decode."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            thumbnail = img.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BOX)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    # 16 grey levels: coarse enough that re-encoding rarely changes it
+    pixels = np.asarray(thumbnail, dtype=np.uint8) >> 4
+    return "n" + hashlib.sha256(pixels.tobytes()).hexdigest()
+
+
+def image_digests(data):
+    """The cache identities of an upload: content digest, then thumbnail digest if it decodes."""
+    digests = [content_digest(data)]
+    thumbnail = thumbnail_digest(data)
+    if thumbnail is not None:
+        digests.append(thumbnail)
+    return digests
+
+
+def vector_key(digest):
+    return f"vec:{MODEL_NAME}:{PREPROCESSING}:{digest}"
+
+
+def result_key(digest, artifact_version, top_k):
+    return f"topk:{artifact_version}:{top_k}:{digest}"
+
+
+def cached_result(digests, artifact_version, top_k):
+    if artifact_version is None:
+        return None
+    found = query_cache.get_many([result_key(d, artifact_version, top_k) for d in digests])
+    return next(iter(found.values()), None)
+
+
+def cached_vector(digests):
+    found = query_cache.get_many([vector_key(d) for d in digests])
+    vector = next(iter(found.values()), None)
+    return None if vector is None else np.frombuffer(vector, dtype=np.float32)
+
+
+def store_query(digests, vector, artifact_version, top_k, ids):
+    values = {vector_key(d): np.asarray(vector, dtype=np.float32).tobytes() for d in digests}
+    if artifact_version is not None:
+        values.update({result_key(d, artifact_version, top_k): ids for d in digests})
+    query_cache.set_many(values)
+
+
+def lookup_cached(data, top_k=12):
+    """Return (cached ids or None, digests of `data` computed on the way)."""
+    store = load_embedding_store()
+    version = store.version if store is not None else None
+    # Exact bytes first; the thumbnail digest costs a decode
+    digests = [content_digest(data)]
+    ids = cached_result(digests, version, top_k)
+    if ids is None:
+        digests = image_digests(data)
+        ids = cached_result(digests[1:], version, top_k)
+    return ids, digests
+
+
+def address():
+    return tuple(IMAGE_SEARCH_ADDRESS) if isinstance(IMAGE_SEARCH_ADDRESS, (list, tuple)) else IMAGE_SEARCH_ADDRESS
+
+
+def search_by_image(data, top_k=12, timeout=None):
+    """Return the ids of the top_k products that look most like the encoded image `data`."""
+    timeout = timeout or IMAGE_SEARCH_TIMEOUT
+    if len(data) > IMAGE_SEARCH_MAX_BYTES:
+        raise ImageSearchUnavailable("Image is too large.")
+    ids, digests = lookup_cached(data, top_k)
+    if ids is not None:
+        return ids
+    try:
+        with Client(address(), authkey=IMAGE_SEARCH_AUTHKEY) as conn:
+            conn.send({"image": data, "top_k": top_k, "digests": digests})
+            if not conn.poll(timeout):
+                raise ImageSearchUnavailable(f"No answer within {timeout}s.")
+            reply = conn.recv()
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        raise ImageSearchUnavailable(str(e) or e.__class__.__name__) from e
+    if "error" in reply:
+        raise ImageSearchUnavailable(reply["error"])
+    return reply["ids"]
+
+
+class ImageSearchServer:
+    """
+    Accepts connections on a Listener and handles each on its own thread:
+    the image is embedded by the process pool and the vector is matched
+    against the recommender's current embedding snapshot.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self.timeout = timeout or IMAGE_SEARCH_TIMEOUT
+        # spawn: worker processes start clean and only import the model code
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers or IMAGE_SEARCH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+
+    def serve_forever(self):
+        # Start the workers now rather than on the first query
+        self.pool.submit(int).result()
+        with Listener(address(), authkey=IMAGE_SEARCH_AUTHKEY) as listener:
+            logger.info("Image search listening on %s", listener.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, multiprocessing.AuthenticationError) as e:
+                    logger.warning("Rejected image search connection: %s", e)
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            try:
+                message = conn.recv()
+            except (OSError, EOFError):
+                return
+            try:
+                reply = {"ids": self.search(message["image"], int(message.get("top_k", 12)),
+                                            message.get("digests"))}
+            except Exception as e:
+                # Unreadable images surface here too (PIL raises an OSError subclass)
+                logger.warning("Image search failed: %r", e)
+                reply = {"error": str(e) or e.__class__.__name__}
+            finally:
+                close_old_connections()
+            try:
+                conn.send(reply)
+            except OSError:
+                pass
+
+    def search(self, data, top_k, digests=None):
+        digests = digests or image_digests(data)
+        engine = recommender.get()
+        version = engine.store.version
+        ids = cached_result(digests, version, top_k)
+        if ids is not None:
+            return ids
+
+        vector = cached_vector(digests)
+        if vector is None:
+            try:
+                vector = self.pool.submit(embed_bytes, data).result(timeout=self.timeout)
+            except FutureTimeout:
+                raise ImageSearchUnavailable(f"Embedding took longer than {self.timeout}s.")
+        ids = engine.nearest(vector, top_k)
+        store_query(digests, vector, version, top_k, ids)
+        return ids
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
@@ -0,0 +1,80 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .image_search import ImageSearchUnavailable, search_by_image
+from .models import ImageSearchJob
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Image search job queue
+# ------------------------------
+# search_page stores an upload as an ImageSearchJob and returns at once;
+# `manage.py run_image_search_worker` claims pending jobs and answers them
+# through the image search service. Any number of workers can poll the
+# same table: a job is claimed by a conditional UPDATE, so only one wins.
+IMAGE_SEARCH_JOB_STALE = getattr(settings, "IMAGE_SEARCH_JOB_STALE", 120)  # seconds running before requeue
+IMAGE_SEARCH_JOB_TTL = getattr(settings, "IMAGE_SEARCH_JOB_TTL", 60 * 60 * 24)  # seconds kept after finishing
+# Seconds a job may stay pending before the search page stops waiting for a worker
+IMAGE_SEARCH_JOB_WAIT = getattr(settings, "IMAGE_SEARCH_JOB_WAIT", 60)
+
+
+def enqueue_image_search(data, top_k=12):
+    return ImageSearchJob.objects.create(image=data, top_k=top_k)
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None if there is none."""
+    pending = (ImageSearchJob.objects.filter(status='pending')
+               .order_by('created_at').values_list('id', flat=True)[:10])
+    for job_id in pending:
+        claimed = ImageSearchJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=timezone.now())
+        if claimed:
+            return ImageSearchJob.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Answer a claimed job; the upload is dropped once it has been searched."""
+    try:
+        job.result_ids = search_by_image(bytes(job.image), job.top_k)
+        job.status = 'done'
+    except ImageSearchUnavailable as e:
+        logger.warning("Image search job %s failed: %s", job.id, e)
+        job.error = str(e)
+        job.status = 'failed'
+    except Exception as e:
+        logger.exception("Image search job %s failed", job.id)
+        job.error = str(e) or e.__class__.__name__
+        job.status = 'failed'
+    job.image = b''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result_ids', 'status', 'error', 'image', 'finished_at'])
+    return job
+
+
+def job_unanswered(job):
+    """
+    Whether the search page should give up on a job: no worker claimed it
+    within IMAGE_SEARCH_JOB_WAIT, or the one that did has stopped.
+    """
+    now = timezone.now()
+    if job.status == 'pending':
+        return job.created_at < now - timedelta(seconds=IMAGE_SEARCH_JOB_WAIT)
+    if job.status == 'running':
+        return job.started_at is not None and job.started_at < now - timedelta(seconds=IMAGE_SEARCH_JOB_STALE)
+    return False
+
+
+def requeue_stale_jobs():
+    """Put back jobs left running by a worker that died; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=IMAGE_SEARCH_JOB_STALE)
+    return ImageSearchJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='pending', started_at=None)
+
+
+def delete_expired_jobs():
+    cutoff = timezone.now() - timedelta(seconds=IMAGE_SEARCH_JOB_TTL)
+    return ImageSearchJob.objects.filter(created_at__lt=cutoff).delete()[0]
@@ -0,0 +1,81 @@
+import time
+import tracemalloc
+import numpy as np
+from django.core.management.base import BaseCommand
+from user_app.ann import IVFIndex
+from user_app.benchmarks import (legacy_recommendations, preference_weights,
+                                 synthetic_catalog, synthetic_signals)
+from user_app.embedding_store import EmbeddingStore, quantize
+from user_app.utils import RecommendationEngine, rank_history
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the recommender scoring paths on synthetic catalogs: p50/p99 latency "
+            "and peak memory per call, for several catalog sizes and history lengths.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000",
+                            help="Comma-separated catalog sizes.")
+        parser.add_argument("--history", default="1,5,10,25,50",
+                            help="Comma-separated session history lengths.")
+        parser.add_argument("--dim", type=int, default=1280, help="Embedding dimension (MobileNetV2: 1280).")
+        parser.add_argument("--repeats", type=int, default=30, help="Timed calls per configuration.")
+        parser.add_argument("--paths", default="legacy,engine,float16,int8,ann",
+                            help="Scoring paths to run: legacy, engine, float16, int8, ann.")
+        parser.add_argument("--legacy-max", type=int, default=10000,
+                            help="Skip the legacy loop above this catalog size (it is very slow).")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",")]
+        history_lengths = [int(h) for h in options["history"].split(",")]
+        paths = options["paths"].split(",")
+
+        self.stdout.write(f"{'products':>9} {'history':>7} {'path':<8} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+        for size in sizes:
+            embeddings, ids, attributes = synthetic_catalog(size, options["dim"])
+            scorers = self.build_scorers(paths, embeddings, ids, attributes, size, options["legacy_max"])
+
+            for length in history_lengths:
+                rng = np.random.default_rng(length)
+                cases = [
+                    (rng.choice(ids, size=min(length, size), replace=False).tolist(),
+                     synthetic_signals(ids, rng, size=min(20, size)))
+                    for _ in range(options["repeats"])
+                ]
+                for name, scorer in scorers:
+                    timings = []
+                    for history, signals in cases:
+                        started = time.perf_counter()
+                        scorer(history, signals)
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                    tracemalloc.start()
+                    scorer(*cases[0])
+                    peak = tracemalloc.get_traced_memory()[1] / 1e6
+                    tracemalloc.stop()
+
+                    self.stdout.write(f"{size:>9} {length:>7} {name:<8} {np.percentile(timings, 50):>9.3f} "
+                                      f"{np.percentile(timings, 99):>9.3f} {peak:>8.1f}")
+
+    def build_scorers(self, paths, embeddings, ids, attributes, size, legacy_max):
+        """Return [(name, scorer(history, signals))] for the requested paths at this size."""
+        scorers = []
+        if "legacy" in paths and size <= legacy_max:
+            scorers.append(("legacy", lambda history, signals: legacy_recommendations(
+                embeddings, ids, attributes, history, signals)))
+
+        engines = []
+        if "engine" in paths:
+            engines.append(("engine", RecommendationEngine(embeddings, ids, attributes)))
+        for dtype in ("float16", "int8"):
+            if dtype in paths:
+                vectors, scales = quantize(embeddings, dtype)
+                engines.append((dtype, RecommendationEngine(EmbeddingStore(vectors, ids, scales), ids, attributes)))
+        if "ann" in paths:
+            index = IVFIndex.build(embeddings, ids)
+            engines.append(("ann", RecommendationEngine(embeddings, ids, attributes, index)))
+
+        for name, engine in engines:
+            scorers.append((name, lambda history, signals, engine=engine: rank_history(
+                engine, history, preference_weights(attributes, *signals))))
+        return scorers
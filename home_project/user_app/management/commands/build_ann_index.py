@@ -0,0 +1,68 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from product_app.catalog import bump_catalog_version
+from user_app.ann import IVFIndex, exact_search, normalize_rows
+from user_app.benchmarks import synthetic_embeddings
+from user_app.utils import file_path_ann_index, load_embedding_store
+
+
+class Command(BaseCommand):
+    help = ("Build the IVF approximate nearest-neighbour index inside the embedding artifact, "
+            "optionally with a recall@k vs latency report against exact search.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lists", type=int, help="Number of inverted lists (default: sqrt(n)).")
+        parser.add_argument("--nprobe", type=int, help="Lists probed per query (default: lists / 16).")
+        parser.add_argument("--report", action="store_true",
+                            help="Print recall@k and latency for a range of nprobe values.")
+        parser.add_argument("--k", type=int, default=10, help="k used for recall@k in the report.")
+        parser.add_argument("--queries", type=int, default=200, help="Number of report queries.")
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Report on N synthetic clustered vectors instead of the real "
+                                 "embeddings, to size settings for a larger catalog. Nothing is saved.")
+        parser.add_argument("--dim", type=int, default=1280, help="Dimension of synthetic vectors.")
+
+    def handle(self, *args, **options):
+        if options["synthetic"]:
+            vectors = synthetic_embeddings(options["synthetic"], options["dim"])
+            ids = np.array([f"SYN{i}" for i in range(len(vectors))])
+        else:
+            store = load_embedding_store()
+            if store is None:
+                raise CommandError("No embedding artifact found. Please run manage.py build_embeddings.")
+            vectors, ids = store.rows(np.arange(len(store))), store.ids
+
+        started = time.perf_counter()
+        index = IVFIndex.build(vectors, ids, n_lists=options["lists"], nprobe=options["nprobe"])
+        self.stdout.write(f"Built {index.n_lists} lists over {len(index)} vectors "
+                          f"in {time.perf_counter() - started:.1f}s (nprobe={index.nprobe}).")
+
+        if not options["synthetic"]:
+            index.save(file_path_ann_index)
+            bump_catalog_version()
+            self.stdout.write(self.style.SUCCESS(f"Saved {file_path_ann_index}"))
+
+        if options["report"] or options["synthetic"]:
+            self.report(index, normalize_rows(vectors), options["k"], options["queries"])
+
+    def report(self, index, vectors, k, n_queries):
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+
+        started = time.perf_counter()
+        exact = [set(exact_search(vectors, q, k)[0]) for q in queries]
+        exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        self.stdout.write(f"\nrecall@{k} over {len(queries)} queries (exact search: {exact_ms:.3f} ms/query)")
+        self.stdout.write(f"{'nprobe':>8} {'recall':>8} {'ms/query':>10} {'speedup':>8} {'scanned':>8}")
+        nprobes = sorted({1, 2, 4, 8, 16, 32, 64, index.nprobe} & set(range(1, index.n_lists + 1)))
+        for nprobe in nprobes:
+            started = time.perf_counter()
+            found = [set(index.search(vectors, q, k, nprobe)[0]) for q in queries]
+            ann_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+            scanned = np.mean([len(index.candidates(q, nprobe)) for q in queries[:20]]) / len(vectors)
+            self.stdout.write(f"{nprobe:>8} {recall:>8.3f} {ann_ms:>10.3f} "
+                              f"{exact_ms / ann_ms:>7.1f}x {scanned:>7.1%}")
+
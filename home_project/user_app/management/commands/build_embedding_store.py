@@ -0,0 +1,149 @@
+import gc
+import os
+import tempfile
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from product_app.catalog import bump_catalog_version
+from user_app.ann import exact_search
+from user_app.embedding_store import EmbeddingStore, STORE_DTYPES, normalize_rows, write_embedding_store
+from user_app.utils import embedding_store_path, file_path_ann_index, load_embedding_store
+from user_app.benchmarks import synthetic_embeddings
+
+
+class Command(BaseCommand):
+    help = ("Re-encode the embedding artifact with another storage dtype, or import legacy "
+            ".npy embeddings into it, optionally reporting memory use and accuracy of each dtype. "
+            "Re-encoding keeps the ANN index; an import removes it, so run build_ann_index again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dtype", choices=STORE_DTYPES, default="float32",
+                            help="Storage type of the vectors. float16 and int8 (per-row scales) "
+                                 "save memory but score slower; see --report.")
+        parser.add_argument("--report", action="store_true",
+                            help="Compare resident memory, scoring latency and top-k accuracy of "
+                                 "every dtype against a private in-memory float32 array.")
+        parser.add_argument("--embeddings", help="Import vectors from this legacy .npy file.")
+        parser.add_argument("--ids", help="Product ids .npy file matching --embeddings.")
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Run the report on N synthetic vectors instead. Nothing is saved.")
+        parser.add_argument("--dim", type=int, default=1280, help="Dimension of synthetic vectors.")
+        parser.add_argument("--k", type=int, default=10, help="k used for recall@k in the report.")
+
+    def handle(self, *args, **options):
+        if options["synthetic"]:
+            embeddings = synthetic_embeddings(options["synthetic"], options["dim"])
+            ids = np.array([f"SYN{i}" for i in range(len(embeddings))])
+        else:
+            store = load_embedding_store()
+            if options["embeddings"]:
+                try:
+                    embeddings = np.load(options["embeddings"], allow_pickle=True)
+                    ids = np.load(options["ids"], allow_pickle=True)
+                except (OSError, TypeError) as e:
+                    raise CommandError(f"Could not read --embeddings/--ids: {e}")
+                # Legacy files do not say which model made them, so the manifest has no
+                # model metadata and the artifact is treated as incompatible: image
+                # similarity stays off until manage.py build_embeddings is run
+                metadata = {}
+                image_names = None
+                # An ANN index of the old vectors does not fit the imported ones
+                keep = ()
+            elif store is not None:
+                embeddings, ids = store.rows(np.arange(len(store))), store.ids
+                metadata = {key: value for key, value in store.manifest.items()
+                            if key in ("model", "input_size", "preprocessing", "catalog_checksum")}
+                image_names = store.image_names
+                # The same vectors in another dtype, so the ANN index still applies
+                keep = (os.path.basename(file_path_ann_index),)
+            else:
+                raise CommandError("No embedding artifact found. Please run manage.py build_embeddings.")
+
+            manifest = write_embedding_store(embedding_store_path, embeddings, ids, options["dtype"],
+                                             image_names=image_names, keep=keep, **metadata)
+            bump_catalog_version()
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {manifest['count']} x {manifest['dim']} {manifest['dtype']} vectors "
+                f"to {embedding_store_path}"))
+            if options["embeddings"]:
+                self.stdout.write(self.style.WARNING(
+                    "Imported vectors carry no model metadata, so image similarity stays off until "
+                    "manage.py build_embeddings is run. Any ANN index was removed."))
+
+        if options["report"] or options["synthetic"]:
+            self.report(embeddings, ids, options["k"])
+
+    def report(self, embeddings, ids, k):
+        if read_rss() is None:
+            self.stdout.write("Resident memory is only reported on Linux (/proc/self/status).")
+
+        reference = normalize_rows(embeddings)
+        rng = np.random.default_rng(0)
+        queries = reference[rng.choice(len(reference), size=min(200, len(reference)), replace=False)]
+        exact = [set(exact_search(reference, q, k)[0]) for q in queries]
+
+        self.stdout.write(f"\n{len(reference)} x {reference.shape[1]} embeddings, recall@{k} over "
+                          f"{len(queries)} queries against float32")
+        self.stdout.write(f"{'format':<18} {'disk MB':>8} {'private MB':>11} {'shared MB':>10} "
+                          f"{'ms/query':>9} {'recall':>7} {'max err':>9}")
+
+        # Previous behaviour: every worker np.load()ed a private float32 copy
+        on_disk = reference.nbytes / 1e6
+        gc.collect()
+        before = read_rss()
+        private_copy = np.array(embeddings, dtype=np.float32)
+        after = read_rss()
+        latency = time_per_query(lambda q: private_copy @ q, queries)
+        self.write_row("in-memory float32", on_disk, before, after, latency, 1.0, 0.0)
+        del private_copy
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for dtype in STORE_DTYPES:
+                path = os.path.join(tmp, dtype)
+                write_embedding_store(path, embeddings, ids, dtype)
+                disk = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1e6
+
+                gc.collect()
+                before = read_rss()
+                store = EmbeddingStore.open(path)
+                store.dot(queries[0])  # touches every page
+                after = read_rss()
+
+                latency = time_per_query(store.dot, queries)
+                scores = [store.dot(q) for q in queries]
+
+                recall = np.mean([len(set(np.argsort(-s)[:k]) & e) / k for s, e in zip(scores, exact)])
+                error = max(np.abs(s - reference @ q).max() for s, q in zip(scores, queries))
+                self.write_row(f"mmap {dtype}", disk, before, after, latency, recall, error)
+                del store, scores
+
+        self.stdout.write("\nprivate = anonymous memory each worker pays; shared = page cache "
+                          "mapped from the store, paid once per host. ms/query = one full scoring pass; "
+                          "float16 and int8 rows are widened to float32 on every pass.")
+
+    def write_row(self, label, disk, before, after, latency, recall, error):
+        if before is None or after is None:
+            private = shared = "n/a"
+        else:
+            private = f"{max(0, after[0] - before[0]) / 1e6:.1f}"
+            shared = f"{max(0, after[1] - before[1]) / 1e6:.1f}"
+        self.stdout.write(f"{label:<18} {disk:>8.1f} {private:>11} {shared:>10} "
+                          f"{latency:>9.2f} {recall:>7.3f} {error:>9.2e}")
+
+
+def time_per_query(score, queries):
+    """Mean milliseconds of score(query) over the queries."""
+    started = time.perf_counter()
+    for query in queries:
+        score(query)
+    return (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def read_rss():
+    """(RssAnon, RssFile) of this process in bytes, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith("Rss"))
+    except OSError:
+        return None
+    return (int(fields["RssAnon"].split()[0]) * 1024, int(fields["RssFile"].split()[0]) * 1024)
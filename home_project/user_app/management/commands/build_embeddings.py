@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand
+from product_app.catalog import bump_catalog_version
+from product_app.models import Product_image
+from user_app.embedding_model import EMBEDDING_DIM, embed, load_image, load_model, model_metadata
+from user_app.embedding_store import STORE_DTYPES, catalog_checksum, write_embedding_store
+from user_app.utils import embedding_store_path, live_product_images, load_embedding_store
+
+
+class Command(BaseCommand):
+    help = ("Embed product images into the embedding artifact. Only products whose image changed "
+            "since the last run are embedded; images are decoded on a thread pool, fed to the model "
+            "in batches, and progress is checkpointed so an interrupted run resumes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=32, help="Images per model call.")
+        parser.add_argument("--workers", type=int, default=4, help="Threads decoding and resizing images.")
+        parser.add_argument("--dtype", choices=STORE_DTYPES, help="Storage dtype (default: keep the current one, float32 for a new artifact).")
+        parser.add_argument("--full", action="store_true", help="Re-embed every product.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        images = live_product_images()
+        previous = load_embedding_store()
+        reusable = {} if options["full"] else reusable_rows(previous)
+
+        todo = sorted(pid for pid, name in images.items() if reusable.get(pid, (None, None))[1] != name)
+        self.stdout.write(f"{len(images)} products with images: {len(images) - len(todo)} unchanged, "
+                          f"{len(todo)} to embed.")
+
+        vectors, failed = self.embed_products(todo, images, options["batch_size"], options["workers"])
+
+        ids, names, rows = [], [], []
+        for pid in sorted(images):
+            if pid in failed:
+                continue
+            if pid in vectors:
+                rows.append(vectors[pid])
+            elif pid in reusable:
+                rows.append(previous.rows([reusable[pid][0]])[0])
+            else:
+                continue
+            ids.append(pid)
+            names.append(images[pid])
+
+        dtype = options["dtype"] or (previous.manifest.get("dtype") if previous else None) or "float32"
+        if previous is not None and not todo and dtype == previous.dtype and ids == previous.ids.tolist():
+            self.stdout.write(self.style.SUCCESS(f"Artifact {previous.version} is up to date."))
+            return
+        manifest = write_embedding_store(
+            embedding_store_path,
+            np.array(rows, dtype=np.float32).reshape(len(rows), EMBEDDING_DIM),
+            ids,
+            dtype=dtype,
+            image_names=names,
+            catalog_checksum=catalog_checksum(zip(ids, names)),
+            **model_metadata(),
+        )
+        shutil.rmtree(checkpoint_path(), ignore_errors=True)
+        # Running processes rebuild their recommender snapshot on the next request
+        bump_catalog_version()
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Could not read images of: {', '.join(sorted(failed))}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Artifact {manifest['artifact_version']}: {len(ids)} embeddings ({len(todo)} new) "
+            f"in {time.perf_counter() - started:.1f}s"))
+
+    def embed_products(self, todo, images, batch_size, workers):
+        """Return ({p_id: vector}, failed p_ids), resuming from a matching checkpoint."""
+        if not todo:
+            return {}, set()
+
+        checkpoint = Checkpoint.open_or_create(todo, [images[pid] for pid in todo])
+        if checkpoint.done:
+            self.stdout.write(f"Resuming after {checkpoint.done} of {len(todo)} from checkpoint.")
+
+        paths = {
+            img.p_id_id: img.image.path
+            for img in Product_image.objects.filter(p_id__in=todo[checkpoint.done:]).order_by('id')
+            if img.image.name == images[img.p_id_id]
+        }
+        model = load_model()
+        remaining = todo[checkpoint.done:]
+        for start, decoded in decode_batches([paths.get(pid) for pid in remaining], batch_size, workers):
+            ok = [i for i, image in enumerate(decoded) if image is not None]
+            batch = np.zeros((len(decoded), EMBEDDING_DIM), dtype=np.float32)
+            if ok:
+                batch[ok] = embed(model, [decoded[i] for i in ok])
+            checkpoint.write(batch, failed=[remaining[start + i] for i in range(len(decoded)) if i not in ok])
+            self.stdout.write(f"  {checkpoint.done}/{len(todo)}")
+
+        vectors = {pid: checkpoint.vectors[i] for i, pid in enumerate(todo) if pid not in checkpoint.failed}
+        return vectors, set(checkpoint.failed)
+
+
+def reusable_rows(store):
+    """{p_id: (row, image name)} from an artifact made with the current model, else {}."""
+    if store is None or store.image_names is None:
+        return {}
+    if any(store.manifest.get(key) != value for key, value in model_metadata().items()):
+        return {}
+    return {pid: (row, name) for row, (pid, name) in enumerate(zip(store.ids.tolist(), store.image_names.tolist()))}
+
+
+def decode_batches(paths, batch_size, workers):
+    """
+    Yield (offset, [array or None]) per batch. The next batch is decoded on the
+    thread pool while the caller runs the model on the current one.
+    """
+    def load(path):
+        try:
+            return load_image(path) if path else None
+        except (OSError, ValueError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        starts = range(0, len(paths), batch_size)
+        pending = None
+        for start in starts:
+            current = pending or [pool.submit(load, p) for p in paths[start:start + batch_size]]
+            following = start + batch_size
+            pending = [pool.submit(load, p) for p in paths[following:following + batch_size]] or None
+            yield start, [future.result() for future in current]
+
+
+def checkpoint_path():
+    return f"{embedding_store_path}.build"
+
+
+class Checkpoint:
+    """
+    Vectors for the products being embedded, in a memory-mapped .npy that is
+    filled batch by batch. progress.json records how many rows are done; a
+    new run with the same work list picks up from there.
+    """
+
+    def __init__(self, path, vectors, progress):
+        self.path = path
+        self.vectors = vectors
+        self.progress = progress
+
+    @property
+    def done(self):
+        return self.progress["done"]
+
+    @property
+    def failed(self):
+        return self.progress["failed"]
+
+    @classmethod
+    def open_or_create(cls, todo, image_names):
+        path = checkpoint_path()
+        key = hashlib.sha1(json.dumps([todo, image_names, model_metadata()]).encode()).hexdigest()
+        progress_file = os.path.join(path, "progress.json")
+        vectors_file = os.path.join(path, "vectors.npy")
+        try:
+            with open(progress_file) as f:
+                progress = json.load(f)
+            if progress["key"] == key:
+                return cls(path, np.load(vectors_file, mmap_mode="r+"), progress)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        vectors = np.lib.format.open_memmap(vectors_file, mode="w+", dtype=np.float32,
+                                            shape=(len(todo), EMBEDDING_DIM))
+        checkpoint = cls(path, vectors, {"key": key, "done": 0, "failed": []})
+        checkpoint.save_progress()
+        return checkpoint
+
+    def write(self, batch, failed=()):
+        self.vectors[self.done:self.done + len(batch)] = batch
+        self.vectors.flush()
+        self.progress["done"] += len(batch)
+        self.progress["failed"].extend(failed)
+        self.save_progress()
+
+    def save_progress(self):
+        tmp = os.path.join(self.path, "progress.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.progress, f)
+        os.replace(tmp, os.path.join(self.path, "progress.json"))
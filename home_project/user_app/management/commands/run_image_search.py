@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from user_app.image_search import ImageSearchServer, address
+
+
+class Command(BaseCommand):
+    help = ("Run the local image search service: a warm embedding model in a process pool, "
+            "queried by search_page over a local connection (IMAGE_SEARCH_ADDRESS).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Model processes (default: IMAGE_SEARCH_WORKERS).")
+        parser.add_argument("--timeout", type=float, help="Seconds allowed per embedding.")
+
+    def handle(self, *args, **options):
+        server = ImageSearchServer(workers=options["workers"], timeout=options["timeout"])
+        self.stdout.write(f"Image search service on {address()}, warming up the model...")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
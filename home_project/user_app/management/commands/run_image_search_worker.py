@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from user_app.image_search import IMAGE_SEARCH_WORKERS
+from user_app.image_search_jobs import claim_next_job, delete_expired_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = ("Answer queued image search jobs. At most --concurrency jobs are in flight at once, "
+            "independent of how many web workers accept uploads.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=IMAGE_SEARCH_WORKERS,
+                            help="Jobs run at the same time (default: IMAGE_SEARCH_WORKERS).")
+        parser.add_argument("--poll", type=float, default=0.5, help="Seconds between checks when idle.")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        running = set()
+        last_maintenance = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                running = {future for future in running if not future.done()}
+
+                if time.monotonic() - last_maintenance > 60:
+                    requeued, deleted = requeue_stale_jobs(), delete_expired_jobs()
+                    if requeued or deleted:
+                        self.stdout.write(f"Requeued {requeued} stale jobs, deleted {deleted} expired jobs.")
+                    last_maintenance = time.monotonic()
+
+                job = claim_next_job() if len(running) < concurrency else None
+                if job is not None:
+                    running.add(pool.submit(self.run, job))
+                    continue
+                if options["once"] and not running:
+                    return
+                time.sleep(options["poll"])
+
+    def run(self, job):
+        try:
+            job = run_job(job)
+            self.stdout.write(f"Job {job.id}: {job.status}")
+        finally:
+            close_old_connections()
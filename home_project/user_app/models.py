@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from product_app.models import Products
@@ -29,3 +30,21 @@ class RecentlyViewed(models.Model):
     class Meta:
         ordering = ['-viewed_at']
         unique_together = ('user', 'product')  # Avoid duplicates
+
+
+class ImageSearchJob(models.Model):
+    """An uploaded search image waiting for, or answered by, run_image_search_worker."""
+    status_choice = [('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    image = models.BinaryField()
+    top_k = models.PositiveSmallIntegerField(default=12)
+    status = models.CharField(choices=status_choice, max_length=10, default='pending')
+    result_ids = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from cart_app.models import Wishlist, Cart_items
+from order_app.models import Order_items
+from .utils import bump_user_signals_version
+
+
+def wishlist_or_cart_changed(sender, instance, **kwargs):
+    """A wishlist or cart change invalidates that user's cached recommendations."""
+    bump_user_signals_version(instance.user_id)
+
+
+def order_item_changed(sender, instance, **kwargs):
+    bump_user_signals_version(instance.order.user_id)
+
+
+for model in (Wishlist, Cart_items):
+    post_save.connect(wishlist_or_cart_changed, sender=model, dispatch_uid=f"signals_save_{model.__name__}")
+    post_delete.connect(wishlist_or_cart_changed, sender=model, dispatch_uid=f"signals_delete_{model.__name__}")
+post_save.connect(order_item_changed, sender=Order_items, dispatch_uid="signals_save_Order_items")
+post_delete.connect(order_item_changed, sender=Order_items, dispatch_uid="signals_delete_Order_items")
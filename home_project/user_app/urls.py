@@ -23,7 +23,8 @@ urlpatterns = [
     path('profile_update/', views.profile_update, name="profile_update"),
     path('delete-profile/', views.profile_delete, name='profile_delete'),
     path('logout/',views.logout_profile,name='logout'),
-    path('search_page/',views.search_page,name="search_page")
+    path('search_page/',views.search_page,name="search_page"),
+    path('search_page/jobs/<uuid:job_id>/', views.image_search_result, name="image_search_result"),
 
 ]
 
@@ -1,113 +1,381 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from collections import namedtuple
+from functools import lru_cache
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from django.db.models import F
 from .models import Products
+from product_app.models import Product_image
 from cart_app.models import Cart, Wishlist
 from order_app.models import Order
+from product_app.catalog import CatalogIndexRegistry, get_catalog_version
+from .ann import IVFIndex
+from .embedding_model import model_metadata
+from .embedding_store import EmbeddingStore, catalog_checksum
 from django.conf import settings
-import os
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
 
 # ------------------------------
-# Load product embeddings and metadata
+# Embedding artifact
+# ------------------------------
+# Written by the build_embeddings command (see user_app.embedding_store for the
+# layout); loaded lazily on first use, not at import.
+embedding_store_path = os.path.join(settings.BASE_DIR, "user_app", "embedding_store")
+# Written by `manage.py build_ann_index`; only used for large catalogs
+file_path_ann_index = os.path.join(embedding_store_path, "ann_index.npz")
+ANN_MIN_PRODUCTS = getattr(settings, "RECOMMENDER_ANN_MIN_PRODUCTS", 5000)
+
+
 # ------------------------------
-# We load two separate files now, to be consistent with our data generation script
-file_path_embeddings = os.path.join(settings.BASE_DIR, "user_app", "product_embeddings.npy")
-file_path_ids = os.path.join(settings.BASE_DIR, "user_app", "product_ids.npy")
+# Scoring engine
+# ------------------------------
+class RecommendationEngine:
+    """
+    Scores the whole catalog against a browsing history in one pass.
+
+    Embeddings are kept L2-normalised in an EmbeddingStore, so the summed
+    cosine similarity of every history item is a single matrix-vector product.
+    """
+
+    def __init__(self, embeddings, ids, attributes=None, ann_index=None):
+        """
+        `embeddings` is either a float matrix row-aligned with `ids`, or an
+        EmbeddingStore, in which case `ids` selects the stored products that
+        take part (for example only those still in the catalog).
+
+        `attributes` maps every known product id to its (category_id, brand).
+        It may cover products that have no embedding yet; those can still
+        contribute category/brand scores as history items.
+
+        With an `ann_index` (user_app.ann.IVFIndex) the image term is only
+        computed for the products in the lists nearest to the history.
+        """
+        self.product_ids = np.array(ids)
+        self.pid_to_index = {pid: i for i, pid in enumerate(self.product_ids)}
+
+        if isinstance(embeddings, EmbeddingStore):
+            self.store = embeddings
+            store_index = {pid: i for i, pid in enumerate(embeddings.ids)}
+            self.store_rows = np.array([store_index[pid] for pid in self.product_ids], dtype=np.intp)
+        else:
+            self.store = EmbeddingStore.from_array(embeddings, self.product_ids)
+            self.store_rows = np.arange(len(self.product_ids), dtype=np.intp)
+        self.ann_index = ann_index.remap(self.pid_to_index) if ann_index is not None else None
+
+        # Integer codes aligned with product_ids; -1 marks a product that is
+        # not in the catalog, so it never matches anything.
+        attributes = attributes or {}
+        self.category_index = {}
+        self.brand_index = {}
+        self.pair_index = {}
+        self.pid_to_codes = {}
+        for pid, (category_id, brand) in attributes.items():
+            cat_code = self.category_index.setdefault(category_id, len(self.category_index))
+            brand_code = self.brand_index.setdefault(brand, len(self.brand_index))
+            pair_code = self.pair_index.setdefault((category_id, brand), len(self.pair_index))
+            self.pid_to_codes[pid] = (cat_code, brand_code, pair_code)
+
+        codes = np.full((len(self.product_ids), 3), -1, dtype=np.int32)
+        for i, pid in enumerate(self.product_ids):
+            if pid in self.pid_to_codes:
+                codes[i] = self.pid_to_codes[pid]
+        # Shift by one so that slot 0 of every lookup table is the "missing" bucket
+        self.category_codes = codes[:, 0] + 1
+        self.brand_codes = codes[:, 1] + 1
+        self.pair_codes = codes[:, 2] + 1
+
+        # Snapshots are shared between threads, so keep them read-only
+        for array in (self.product_ids, self.store_rows, self.category_codes,
+                      self.brand_codes, self.pair_codes):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def history_positions(self, history):
+        """Return (positions in history, catalog indices) for the known product ids."""
+        pairs = [(pos, self.pid_to_index[pid]) for pos, pid in enumerate(history)
+                 if pid in self.pid_to_index]
+        if not pairs:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        positions, indices = zip(*pairs)
+        return np.array(positions, dtype=np.intp), np.array(indices, dtype=np.intp)
+
+    def image_scores(self, indices):
+        """Sum of cosine similarities between the given products and the catalog."""
+        if not len(indices):
+            return np.zeros(len(self), dtype=np.float32)
+        return self.vector_scores(self.store.rows(self.store_rows[indices]).sum(axis=0))
+
+    def vector_scores(self, query):
+        """Inner product of `query` with every catalog embedding."""
+        if self.ann_index is None:
+            return self.store.dot(query)[self.store_rows]
+        # Products outside the probed lists are treated as dissimilar
+        rows = self.ann_index.candidates(query)
+        scores = np.zeros(len(self), dtype=np.float32)
+        scores[rows] = self.store.dot(query, self.store_rows[rows])
+        return scores
 
-if not os.path.exists(file_path_embeddings) or not os.path.exists(file_path_ids):
-    raise FileNotFoundError("Embeddings or IDs file not found. Please run create_embeddings.py.")
+    def nearest(self, query, k):
+        """Ids of the k products whose image embedding is most similar to `query`, best first."""
+        if self.store.dim != len(query):
+            return []
+        return self.top_k(self.vector_scores(query), k)
 
-product_embeddings = np.load(file_path_embeddings, allow_pickle=True)
-product_ids = np.load(file_path_ids, allow_pickle=True)
+    def recency_scores(self, positions, indices, history_length):
+        """More recently viewed products (lower position) get a higher boost."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        if len(indices):
+            np.add.at(scores, indices, 1 - positions / history_length)
+        return scores
 
-# Create a fast lookup dictionary for product IDs
-# This is much faster than np.where for repeated lookups.
-pid_to_index = {pid: i for i, pid in enumerate(product_ids)}
+    def catbrand_scores(self, pids, w_category=0.6, w_brand=0.4):
+        """
+        Sum over the given products of w_category for every catalog item in the
+        same category plus w_brand for every item of the same brand.
+        """
+        codes = [self.pid_to_codes[pid] for pid in pids if pid in self.pid_to_codes]
+        if not codes:
+            return np.zeros(len(self), dtype=np.float32)
+        cat_codes, brand_codes, _ = np.array(codes, dtype=np.int32).T
+        cat_table = np.bincount(cat_codes + 1, minlength=len(self.category_index) + 1)
+        brand_table = np.bincount(brand_codes + 1, minlength=len(self.brand_index) + 1)
+        cat_table[0] = brand_table[0] = 0
+        return (w_category * cat_table[self.category_codes]
+                + w_brand * brand_table[self.brand_codes]).astype(np.float32)
+
+    def preference_scores(self, pair_weights):
+        """Spread {(category_id, brand): weight} over every catalog item of that pair."""
+        table = np.zeros(len(self.pair_index) + 1, dtype=np.float32)
+        for pair, weight in pair_weights.items():
+            code = self.pair_index.get(pair)
+            if code is not None:
+                table[code + 1] += weight
+        return table[self.pair_codes]
+
+    def top_k(self, scores, k, exclude=()):
+        """Return the ids of the k best scoring products, best first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        scores = np.array(scores, dtype=np.float64)
+        scores[np.asarray(exclude, dtype=np.intp)] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [str(self.product_ids[i]) for i in top]
 
-# Pre-fetch all product data to avoid N+1 queries later
-all_products = Products.objects.all().select_related('category', 'sub_category')
-pid_to_product = {p.p_id: p for p in all_products}
 
 
 # ------------------------------
-# Helper: Get index of product (now uses a dictionary for speed)
+# Recommender registry
+# ------------------------------
+@lru_cache(maxsize=1)
+def _read_embeddings(mtime_key):
+    """Open the embedding artifact memory-mapped; cached until it is rewritten."""
+    return EmbeddingStore.open(embedding_store_path)
+
+
+def load_embedding_store():
+    """Return the current EmbeddingStore, or None if no embeddings have been built."""
+    try:
+        return _read_embeddings(os.path.getmtime(os.path.join(embedding_store_path, "manifest.json")))
+    except OSError:
+        return None
+
+
+class ArtifactStatus(namedtuple("ArtifactStatus", "version compatible missing_ids extra_ids changed_ids")):
+    """
+    How an embedding artifact lines up with the embedding model and the live
+    catalog: ids with an image but no vector, vectors for deleted products,
+    and vectors made from an image that has since been replaced.
+    """
+
+    @property
+    def stale(self):
+        return bool(self.missing_ids or self.extra_ids or self.changed_ids)
+
+    @property
+    def usable(self):
+        return self.compatible and self.version is not None
+
+
+def live_product_images():
+    """{p_id: name of its first image}, the image embeddings are made from."""
+    first = {}
+    for p_id, image in Product_image.objects.order_by('id').values_list('p_id_id', 'image'):
+        if image:
+            first.setdefault(p_id, image)
+    return first
+
+
+def check_embedding_artifact(store, product_ids):
+    """Compare `store` against the current embedding model and the given live product ids."""
+    if store is None:
+        return ArtifactStatus(None, False, set(product_ids), set(), set())
+    compatible = all(store.manifest.get(key) == value for key, value in model_metadata().items())
+
+    images = live_product_images()
+    if catalog_checksum(images.items()) == store.manifest.get("catalog_checksum"):
+        return ArtifactStatus(store.version, compatible, set(), set(), set())
+
+    stored = dict(zip(store.ids.tolist(), store.image_names.tolist())) \
+        if store.image_names is not None else dict.fromkeys(store.ids.tolist())
+    missing = {pid for pid in images if pid in product_ids and pid not in stored}
+    extra = {pid for pid in stored if pid not in product_ids}
+    changed = {pid for pid, name in stored.items()
+               if pid in images and name is not None and name != images[pid]}
+    return ArtifactStatus(store.version, compatible, missing, extra, changed)
+
+
+def load_engine():
+    """
+    Build a RecommendationEngine from the embedding artifact and the live catalog.
+
+    Embedded products that no longer exist are dropped. If the embeddings are
+    missing the engine still works, but without the image-similarity term.
+    """
+    attributes = {
+        p_id: (category_id, brand)
+        for p_id, category_id, brand in Products.objects.values_list('p_id', 'category_id', 'brand')
+    }
+
+    store = load_embedding_store()
+    status = check_embedding_artifact(store, attributes)
+    if not status.usable:
+        logger.warning("Embedding artifact missing or made with a different model, recommending "
+                       "without image similarity. Please run manage.py build_embeddings.")
+        store = EmbeddingStore.from_array(np.zeros((0, 0), dtype=np.float32), [])
+    elif status.stale:
+        logger.warning("Embedding artifact %s is stale: %d products without vectors, %d deleted, "
+                       "%d with a new image. Please run manage.py build_embeddings.", status.version,
+                       len(status.missing_ids), len(status.extra_ids), len(status.changed_ids))
+
+    # Vectors of deleted products or of replaced images are left out
+    live_ids = [pid for pid in store.ids if pid in attributes and pid not in status.changed_ids]
+    ann_index = None
+    if len(live_ids) >= ANN_MIN_PRODUCTS and os.path.exists(file_path_ann_index):
+        ann_index = IVFIndex.load(file_path_ann_index)
+    return RecommendationEngine(store, live_ids, attributes, ann_index)
+
+
+class RecommenderRegistry(CatalogIndexRegistry):
+    """
+    Holds one immutable engine snapshot per process, swapped for a new one
+    when the catalog version changes (see product_app.signals).
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self._loader = loader
+
+    def build(self, previous):
+        # Engines are never patched; each catalog version gets a new one
+        return self._loader()
+
+
+recommender = RecommenderRegistry(load_engine)
+
+
+# ------------------------------
+# Helper: Get index of product
 # ------------------------------
 def get_product_index(product_id):
     """Return the index of a product in embeddings based on product_id."""
-    return pid_to_index.get(product_id)
+    return recommender.get().pid_to_index.get(product_id)
 
 # ------------------------------
 # Image similarity
 # ------------------------------
 def get_image_similarity(pid):
     """Return cosine similarity of a product's embedding with all products."""
-    idx = get_product_index(pid)
+    engine = recommender.get()
+    idx = engine.pid_to_index.get(pid)
     if idx is None:
         return None
-    emb = product_embeddings[idx].reshape(1, -1)
-    sims = cosine_similarity(emb, product_embeddings)[0]
-    return sims
+    return engine.image_scores([idx])
 
 # ------------------------------
 # Category + Brand similarity
 # ------------------------------
 def get_category_brand_similarity(pid):
     """Return similarity scores based on a product's category and brand."""
-    target = pid_to_product.get(pid)
-    if not target:
-        return np.zeros(len(product_ids))
-
-    sims = []
-    # Loop over the pre-fetched products, not a list of IDs
-    for db_pid in product_ids:
-        p = pid_to_product.get(db_pid)
-        if not p:
-            sims.append(0)
-            continue
-
-        score = 0
-        if p.category == target.category:
-            score += 0.6
-        if p.brand == target.brand:
-            score += 0.4
-        sims.append(score)
-
-    return np.array(sims)
+    return recommender.get().catbrand_scores([pid])
 
 # ------------------------------
 # User preference similarity
 # ------------------------------
-def get_user_preference_similarity(user):
-    """Return similarity scores based on user's wishlist, cart, and orders."""
+def get_user_preference_weights(user):
+    """Return {(category_id, brand): weight} from the user's wishlist, cart, and orders."""
     prefs = {}
 
     cart_pids = set(Cart.objects.filter(user=user).values_list('cart_items__product_id', flat=True))
     order_pids = set(Order.objects.filter(user=user).values_list('items__product_id', flat=True))
 
     wishlist_pids = set(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
-    
-    user_products = Products.objects.filter(p_id__in=wishlist_pids | cart_pids | order_pids)
-    
-    for product in user_products:
-        key = (product.category, product.brand)
+
+    user_products = Products.objects.filter(
+        p_id__in=wishlist_pids | cart_pids | order_pids
+    ).values_list('p_id', 'category_id', 'brand')
+
+    for p_id, category_id, brand in user_products:
+        key = (category_id, brand)
         weight = 0
-        if product.p_id in wishlist_pids:
+        if p_id in wishlist_pids:
             weight += 1
-        if product.p_id in cart_pids:
+        if p_id in cart_pids:
             weight += 2
-        if product.p_id in order_pids:
+        if p_id in order_pids:
             weight += 3
         prefs[key] = prefs.get(key, 0) + weight
 
-    sims = []
-    for db_pid in product_ids:
-        p = pid_to_product.get(db_pid)
-        if p:
-            sims.append(prefs.get((p.category, p.brand), 0))
-        else:
-            sims.append(0)
+    return prefs
 
-    return np.array(sims)
+
+def get_user_preference_similarity(user, engine=None):
+    """Return similarity scores based on user's wishlist, cart, and orders."""
+    engine = engine or recommender.get()
+    return engine.preference_scores(get_user_preference_weights(user))
+
+
+# ------------------------------
+# Recommendation cache
+# ------------------------------
+# Results are cached per user in the "recommendations" cache (TTL + LRU, see
+# settings.CACHES). Keys include the catalog version and a per-user signals
+# version that user_app.signals bumps when the wishlist, cart or orders change.
+# Versions are random tokens like the catalog version, so a version culled
+# from the "user_signals" cache comes back as a new token and can never
+# match a recommendation cached under an earlier one.
+USER_SIGNALS_VERSION_KEY = "user_signals_version:{}"
+
+
+def get_user_signals_version(user_id):
+    cache = caches["user_signals"]
+    key = USER_SIGNALS_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_signals_version(user_id):
+    caches["user_signals"].set(USER_SIGNALS_VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def recommendation_cache_key(request, history, top_k, weights):
+    if request.user.is_authenticated:
+        user_part = f"{request.user.pk}:{get_user_signals_version(request.user.pk)}"
+    else:
+        user_part = "anon"
+    history_hash = hashlib.sha1(json.dumps([history, top_k, weights]).encode()).hexdigest()
+    return f"recs:{get_catalog_version()}:{user_part}:{history_hash}"
 
 
 # ------------------------------
@@ -121,50 +389,47 @@ def weighted_hybrid_recommendations(request, top_k=6,
     2. Category/Brand similarity
     3. User history (recency boost)
     4. User preferences (wishlist/cart/orders)
+
+    Results are served from the per-user recommendation cache when possible.
     """
     history = request.session.get("history", [])
-    scores = np.zeros(len(product_ids))
+    weights = [w_image, w_catbrand, w_history, w_user]
+    cache = caches["recommendations"]
+    key = recommendation_cache_key(request, history, top_k, weights)
+    recommended_ids = cache.get(key)
+    if recommended_ids is None:
+        recommended_ids = score_recommendations(request, history, top_k, *weights)
+        cache.set(key, recommended_ids)
+    return recommended_ids
+
+
+def score_recommendations(request, history, top_k, w_image, w_catbrand, w_history, w_user):
+    """Run the full scoring pass for a history (and the signed-in user's signals)."""
+    pair_weights = None
+    if request.user.is_authenticated:
+        pair_weights = get_user_preference_weights(request.user)
+    return rank_history(recommender.get(), history, pair_weights, top_k,
+                        w_image, w_catbrand, w_history, w_user)
+
+
+def rank_history(engine, history, pair_weights=None, top_k=6,
+                 w_image=0.4, w_catbrand=0.2, w_history=0.2, w_user=0.2):
+    """Score the catalog for a history and optional preference weights; no DB access."""
+    positions, indices = engine.history_positions(history)
 
-    # --- 1. Image similarity ---
-    for pid in history:
-        img_sims = get_image_similarity(pid)
-        if img_sims is not None:
-            scores += w_image * img_sims
+    # --- 1. Image similarity (all history items in one matrix product) ---
+    scores = w_image * engine.image_scores(indices)
 
     # --- 2. Category/Brand similarity ---
-    for pid in history:
-        catbrand_sims = get_category_brand_similarity(pid)
-        if catbrand_sims is not None:
-            scores += w_catbrand * catbrand_sims
+    scores += w_catbrand * engine.catbrand_scores(history)
 
     # --- 3. History preference (recency boost) ---
-    for i, pid in enumerate(history):
-        idx = get_product_index(pid)
-        if idx is not None:
-            # More recent = higher weight
-            scores[idx] += w_history * (1 - i / len(history))
+    if history:
+        scores += w_history * engine.recency_scores(positions, indices, len(history))
 
     # --- 4. User preference signals ---
-    if request.user.is_authenticated:
-        user_sims = get_user_preference_similarity(request.user)
-        scores += w_user * user_sims
-
-    # --- Exclude already viewed ---
-    history_indices = [get_product_index(pid) for pid in history if get_product_index(pid) is not None]
-    scores[history_indices] = -np.inf
-
-    # --- Get top-k recommendations ---
-    top_indices = np.argsort(scores)[::-1]
-    recommended_ids = []
-    seen = set()
-    for i in top_indices:
-        if i < 0 or i >= len(product_ids):
-            continue
-        pid = str(product_ids[i])
-        if pid not in seen:
-            seen.add(pid)
-            recommended_ids.append(pid)
-        if len(recommended_ids) == top_k:
-            break
+    if pair_weights is not None:
+        scores += w_user * engine.preference_scores(pair_weights)
 
-    return recommended_ids
+    # --- Exclude already viewed and select top-k ---
+    return engine.top_k(scores, top_k, exclude=indices)
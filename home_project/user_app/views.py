@@ -1,8 +1,7 @@
 from django.shortcuts import render,redirect
 from category_app.models import Category
 from sub_category_app.models import Sub_category
-from product_app.models import Products,Product_image,Discount
-from django.db.models import Case, When
+from product_app.models import Products
 from django.contrib.auth import authenticate,login,logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
@@ -10,17 +9,25 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from .models import Profile, RecentlyViewed
 from cart_app.models import Cart_items,Wishlist
-from django.db.models import Sum,Q
+from django.db.models import Sum
 from .forms import ImageSearchForm
 import numpy as np
 from .utils import weighted_hybrid_recommendations
-import requests
+from .image_search import lookup_cached
+from search_app.facets import cached_facet_rows, facet_counts, facet_links, filter_ids, selected_facets
+from search_app.results import cached_search
+from .image_search_jobs import enqueue_image_search, job_unanswered
+from .models import ImageSearchJob
+from django.http import JsonResponse
+from django.urls import reverse
+from django.template.loader import render_to_string
+from product_app.pagination import keyset_page, ranked_page
+from product_app.cards import product_cards
+import uuid
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.db.models import Q
 from .models import Products
 from .forms import ImageSearchForm
-import json
-import base64
 from django.db.models import Count
 
 from django.shortcuts import render
@@ -35,10 +42,10 @@ def home(request):
     if request.user.is_authenticated:
         total_items = Cart_items.objects.filter(cart__user=request.user).aggregate(Sum('quantity'))['quantity__sum'] or 0
         recommended_ids = weighted_hybrid_recommendations(request, top_k=6)
-        recommended_products = Products.objects.filter(p_id__in=recommended_ids)
+        recommended_products = product_cards(recommended_ids)
 
         recently_viewed = RecentlyViewed.objects.filter(user=request.user).order_by('-viewed_at')[:8]
-        recently_viewed_products = [rv.product for rv in recently_viewed]
+        recently_viewed_products = product_cards(recently_viewed.values_list('product_id', flat=True))
 
     else:
         popular_products = RecentlyViewed.objects.all() \
@@ -46,20 +53,20 @@ def home(request):
                         .annotate(view_count=Count('product')) \
                         .order_by('-view_count')[:6]
         popular_ids = [p['product'] for p in popular_products]
-        recommended_products = Products.objects.filter(p_id__in=popular_ids)
-        # For anonymous users, get products from session
+        recommended_products = product_cards(popular_ids)
+        # For anonymous users, get products from session, in session order
         session_rv = request.session.get('recently_viewed', [])
-        recently_viewed_products = Products.objects.filter(p_id__in=session_rv)
-        # Optional: maintain the order from session
-        recently_viewed_products = sorted(recently_viewed_products, key=lambda x: session_rv.index(x.p_id))
+        recently_viewed_products = product_cards(session_rv)
 
     
+    # The image of each brand's first product, for all brands at once
+    brand_ids = {}
+    for brand, p_id in Products.objects.filter(brand__in=ALLOWED_BRANDS).order_by('p_id').values_list('brand', 'p_id'):
+        brand_ids.setdefault(brand, p_id)
+    brand_images = {card.brand: card.image_url for card in product_cards(brand_ids.values())}
     for brand in ALLOWED_BRANDS:
-        product = Products.objects.filter(brand=brand).first()  # any product from that brand
-        if product:
-            product_image = Product_image.objects.filter(p_id=product.p_id).first()  # first image of that product
-            if product_image:
-                brand_products[brand] = product_image.image.url  # store brand → image URL
+        if brand_images.get(brand):
+            brand_products[brand] = brand_images[brand]  # store brand → image URL
 
     return render(request, "user/home.html", locals())
 
@@ -85,7 +92,6 @@ def living(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -99,10 +105,9 @@ def living(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/living.html',locals())
@@ -111,7 +116,6 @@ def bedroom(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -125,10 +129,9 @@ def bedroom(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/bedroom.html',locals())
@@ -137,7 +140,6 @@ def dining(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -151,10 +153,9 @@ def dining(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/dining.html',locals())
@@ -163,7 +164,6 @@ def decor(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -177,10 +177,9 @@ def decor(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/decor.html',locals())
@@ -189,7 +188,6 @@ def kids(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -203,10 +201,9 @@ def kids(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/kids.html',locals())
@@ -215,7 +212,6 @@ def lighting(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     
@@ -229,10 +225,9 @@ def lighting(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/lighting.html',locals())
@@ -241,7 +236,6 @@ def kitchen(request,id):
     category = Category.objects.get(category_id=id)
     sub_category = Sub_category.objects.filter(category=category)
     all_products = Products.objects.filter(sub_category__in=sub_category)
-    product_images = []
 
     exclusive_products = [
     "Gravis Stellar 5Pcs Triply Stainless Steel Cookware Set",
@@ -254,10 +248,9 @@ def kitchen(request,id):
 
     filtered_products = all_products.filter(p_name__in=exclusive_products)
 
-    for i in filtered_products:
-        image = Product_image.objects.filter(p_id=i).first()
-        if image:
-            product_images.append({'product': i, 'image': image.image})
+    # Only products with an image are featured
+    product_images = [card for card in product_cards(filtered_products.values_list("p_id", flat=True))
+                      if card.image_url]
 
     product_groups = group_items(product_images, 4)
     return render(request,'user/kitchen.html',locals())
@@ -280,11 +273,10 @@ def group_sub_items(items, group_size):
     return [extended_items[i:i + group_size] for i in range(0, len(extended_items), group_size)]
 
 
-from django.db.models import Case, When
 
 def product_page(request, id=None, sub_id=None, brand=None):
     category = Category.objects.all()
-    sub_cats = Sub_category.objects.all()
+    sub_cats = Sub_category.objects.select_related('category')
 
     try:
         wishlist_ids = list(
@@ -337,29 +329,6 @@ def product_page(request, id=None, sub_id=None, brand=None):
         all_products = all_products.filter(brand__iexact=brand.strip())
         brand_name = brand
 
-    print("Brand passed:", brand)
-    print("Filtered products count:", all_products.count())
-
-    # Sorting logic
-    if order == 'asc':
-        all_products = all_products.order_by('date')
-    elif order == 'desc':
-        all_products = all_products.order_by('-date')
-    elif order == 'lowest':
-        all_products = all_products.order_by('price')
-    elif order == 'highest':
-        all_products = all_products.order_by('-price')
-    elif order == 'high_disc':
-        discounts = Discount.objects.filter(product__in=all_products).order_by('-disc_percent')
-        discounted_ids = [disc.product.p_id for disc in discounts]
-        rank_map = {pid: pos for pos, pid in enumerate(discounted_ids)}
-        preserved = Case(*[
-            When(p_id=pid, then=rank_map.get(pid, 9999))
-            for pid in all_products.values_list('p_id', flat=True)
-        ])
-        all_products = all_products.order_by(preserved)
-
-    
     discount_filter = request.GET.get("discount")
     if discount_filter == "min70":
         all_products = all_products.filter(discount__disc_percent__gte=70)
@@ -374,16 +343,16 @@ def product_page(request, id=None, sub_id=None, brand=None):
         all_products = all_products.filter(price__lte=999)
 
 
-    # collect product images + discounts
-    product_images = []
-    for product in all_products:
-        image = Product_image.objects.filter(p_id=product).first()
-        discount = Discount.objects.filter(product=product).first()
-        product_images.append({
-            'product_id': product,
-            'image': image,
-            'discount': discount
-        })
+    # One page at a time, seeking past the cursor in the chosen order
+    page = keyset_page(all_products, order or "", request.GET.get("cursor"))
+    next_url, next_json_url = page_urls(request, page.next_cursor)
+
+    # Image and discount of every product on the page in one query
+    product_images = product_cards(product.p_id for product in page.items)
+
+    if request.GET.get("format") == "json":
+        return page_json(request, "user/product_page_cards.html", {
+            "product_images": product_images, "wishlist_ids": wishlist_ids}, next_url, next_json_url)
 
     sub_cat_groups = group_items(sub_cats, 6)
 
@@ -482,7 +451,14 @@ def search_page(request):
     """
     query = request.GET.get("q", "")
     form = ImageSearchForm(request.POST or None, request.FILES or None)
-    products = Products.objects.none()
+    products = []
+    search_error = None
+    image_job = None
+    image_job_pending = False
+    facets = None
+    corrected_query = None
+    related = False
+    next_url = next_json_url = None
 
     # Initialize recent searches
     if "recent_searches" not in request.session:
@@ -495,23 +471,21 @@ def search_page(request):
 
     # ------------------ TEXT SEARCH ------------------
     if query:
-        products = Products.objects.filter(
-            Q(p_name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__category_name__icontains=query) |
-            Q(sub_category__sub_cat_name__icontains=query) |
-            Q(brand__icontains=query)
-        ).only("p_id", "p_name", "price").prefetch_related("product_image_set")
+        # Ids, spelling correction and thumbnail are cached until the catalog changes
+        result = cached_search(query)
+        corrected_query = result.corrected_query
+        related = result.related
+        selected = selected_facets(request.GET)
+        facet_rows = cached_facet_rows(corrected_query or query, result.ids)
+        facets = facet_links(request.GET, facet_counts(facet_rows, selected), selected)
+        page = ranked_page(result.ids, request.GET.get("cursor"), keep=lambda chunk: filter_ids(chunk, selected))
+        products = product_cards(page.items)
+        next_url, next_json_url = page_urls(request, page.next_cursor)
+        if request.GET.get("format") == "json":
+            return page_json(request, "user/search_page_cards.html", {"products": products}, next_url, next_json_url)
 
         # Save text search in recent searches
-        first_image_url = None
-        first_product = products.first()
-        if first_product:
-            first_image = first_product.product_image_set.first()
-            if first_image:
-                first_image_url = first_image.image.url
-
-        new_entry = {"text": query, "image": first_image_url}
+        new_entry = {"text": query, "image": result.image_url}
         recent_searches = request.session["recent_searches"]
         if new_entry not in recent_searches:
             recent_searches.insert(0, new_entry)
@@ -522,49 +496,100 @@ def search_page(request):
     elif request.method == "POST" and form.is_valid():
         uploaded_image = request.FILES.get("image")
         if uploaded_image:
-            try:
-                # Encode the uploaded image as base64
-                base64_image = base64.b64encode(uploaded_image.read()).decode("utf-8")
-
-                # Your ML service API endpoint
-                ml_api_url = "https://home-furnishing-ml.streamlit.app/"
-
-                # Prepare JSON payload
-                payload = {"image": f"data:{uploaded_image.content_type};base64,{base64_image}"}
-                headers = {"Content-Type": "application/json"}
-
-                # Send POST request to ML service
-                response = requests.post(ml_api_url, headers=headers, data=json.dumps(payload), timeout=60)
-                response.raise_for_status()
-
-                # Parse API response
-                api_response = response.json()
-                matching_ids = api_response.get("product_ids", [])
-                image_description = api_response.get("description", "")
-
-                # Query products based on ML results
-                if matching_ids:
-                    products = Products.objects.filter(p_id__in=matching_ids).prefetch_related("product_image_set")
-                elif image_description:
-                    products = Products.objects.filter(
-                        Q(p_name__icontains=image_description) |
-                        Q(description__icontains=image_description) |
-                        Q(category__category_name__icontains=image_description) |
-                        Q(sub_category__sub_cat_name__icontains=image_description) |
-                        Q(brand__icontains=image_description)
-                    ).only("p_id", "p_name", "price").prefetch_related("product_image_set")
-
-            except requests.exceptions.RequestException as e:
-                print(f"Error contacting ML API: {e}")
-            except Exception as e:
-                print(f"Unexpected error: {e}")
+            data = uploaded_image.read()
+            matching_ids, _ = lookup_cached(data)
+            if matching_ids is None:
+                # Answered by run_image_search_worker; the page polls image_search_result
+                job = enqueue_image_search(data)
+                return redirect(f"{reverse('search_page')}?job={job.id}")
+            products = product_cards(matching_ids)
+
+    elif request.GET.get("job"):
+        image_job = ImageSearchJob.objects.filter(id=parse_job_id(request.GET["job"])).first()
+        if image_job is None:
+            search_error = "This image search has expired. Please upload the image again."
+        elif image_job.status == "done":
+            products = product_cards(image_job.result_ids)
+        elif image_job.status == "failed" or job_unanswered(image_job):
+            search_error = "Image search is not available right now. Please try again later."
+        else:
+            image_job_pending = True
 
     # Get recent searches for template
     recent_searches = request.session.get("recent_searches", [])[:10]
 
     return render(request, "user/search_page.html", {
         "query": query,
+        "corrected_query": corrected_query,
+        "related": related,
         "products": products,
         "recent_searches": recent_searches,
         "form": form,
-    })
\ No newline at end of file
+        "search_error": search_error,
+        "image_job": image_job,
+        "facets": facets,
+        "next_url": next_url,
+        "next_json_url": next_json_url,
+        "image_job_pending": image_job_pending,
+    })
+
+
+def page_urls(request, next_cursor):
+    """(next page URL, its JSON variant) keeping the current filters, or (None, None) on the last page."""
+    if next_cursor is None:
+        return None, None
+    params = request.GET.copy()
+    params["cursor"] = next_cursor
+    params.pop("format", None)
+    next_url = f"?{params.urlencode()}"
+    params["format"] = "json"
+    return next_url, f"?{params.urlencode()}"
+
+
+def page_json(request, template, context, next_url, next_json_url):
+    """A page of product cards for infinite scroll: their HTML and where the next page is."""
+    return JsonResponse({
+        "html": render_to_string(template, context, request=request),
+        "next": next_json_url,
+        "next_page": next_url,
+    })
+
+
+def parse_job_id(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def product_summaries(p_ids):
+    """JSON-ready name, price, link and first image for each product, in the order given."""
+    summaries = []
+    for card in product_cards(p_ids):
+        summaries.append({
+            "p_id": card.p_id,
+            "p_name": card.p_name,
+            "price": str(card.price),
+            "url": reverse("product_details", args=[card.p_id]),
+            "image": card.image_url,
+        })
+    return summaries
+
+
+async def image_search_result(request, job_id):
+    """Status of an image search job, with the matched products once it is done."""
+    # Async: pending search pages poll this every second
+    job = await (ImageSearchJob.objects.filter(id=job_id)
+                 .only("status", "result_ids", "error", "created_at", "started_at").afirst())
+    if job is None:
+        return JsonResponse({"status": "missing"}, status=404)
+    if job_unanswered(job):
+        # No worker is answering; the page shows that instead of polling on
+        return JsonResponse({"status": "unavailable"})
+
+    data = {"status": job.status}
+    if job.status == "done":
+        data["products"] = await sync_to_async(product_summaries)(job.result_ids)
+    elif job.status == "failed":
+        data["error"] = job.error
+    return JsonResponse(data)
\ No newline at end of file